@@ -0,0 +1,253 @@
+import argparse
+import collections
+import contextlib
+import gzip
+import importlib.util
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ocr_backends import build_backend
+from rasterizer import check_grid_size
+
+# Server module loaded in each render process by _init_worker
+_server = None
+
+# What the server module must provide for its /recognize pipeline to be reused here
+SERVER_API = (
+    'BACKEND_ARGS', 'BACKEND_NAME', 'GEOMETRY_WORDS', 'strokes_to_image', 'segment_board',
+    'decoded_words', 'words_response', 'results_response'
+)
+
+class ServerModuleError(ValueError):
+    """Raised when the --server module lacks the pipeline functions this tool reuses"""
+
+def load_server(path):
+    """Import a server module for its rendering pipeline and OCR configuration"""
+    spec = importlib.util.spec_from_file_location('batch_server', path)
+    server = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(server)
+    return server
+
+def open_input(path):
+    """Open a JSONL input, gzip-compressed if its name ends in .gz; '-' is stdin"""
+    if path == '-':
+        # Left open for the rest of the process
+        return contextlib.nullcontext(sys.stdin)
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+def read_records(path, start=0):
+    """Yield (offset, line) for every non-blank input line from record offset start on"""
+    with open_input(path) as f:
+        offset = 0
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if offset >= start:
+                yield offset, line
+            offset += 1
+
+def resume_offset(path):
+    """Record offset after the last complete output line, or 0 if there is no output yet
+
+    A line cut short by an interrupted run is truncated away so appending can continue.
+    Only the end of the file is read.
+    """
+    if path == '-' or not os.path.exists(path):
+        return 0
+    with open(path, 'rb+') as f:
+        position = f.seek(0, os.SEEK_END)
+        tail = b''
+        while position > 0 and tail.count(b'\n') < 2:
+            step = min(64 * 1024, position)
+            position -= step
+            f.seek(position)
+            tail = f.read(step) + tail
+        complete = tail[:tail.rfind(b'\n') + 1]
+        f.truncate(position + len(complete))
+    lines = complete.splitlines()
+    if not lines:
+        return 0
+    return json.loads(lines[-1])['offset'] + 1
+
+def _init_worker(server_path):
+    global _server
+    _server = load_server(server_path)
+
+def _render(offset, line):
+    """Parse one record and render it the way /recognize does; runs in a render process
+
+    Returns the offset, the record id, and either ('words', words, image, boxes) for
+    geometry segmentation or ('image', image) for whole-image recognition, plus an error.
+    """
+    record_id = None
+    try:
+        record = json.loads(line)
+        record_id = record.get('id')
+        strokes = record.get('strokes')
+        if not strokes:
+            return offset, record_id, None, 'No strokes provided'
+        grid_size = check_grid_size(record.get('gridSize', 40))
+        if _server.GEOMETRY_WORDS:
+            return offset, record_id, ('words',) + _server.segment_board(strokes, grid_size), None
+        image = np.array(_server.strokes_to_image(strokes, grid_size))
+        return offset, record_id, ('image', image), None
+    except Exception as e:
+        return offset, record_id, None, str(e)
+
+class Progress:
+    """Print records per second to stderr every report_seconds"""
+
+    def __init__(self, start, report_seconds=10.0):
+        self.start = start
+        self.report_seconds = report_seconds
+        self.done = 0
+        self.errors = 0
+        self.began = self.reported = time.perf_counter()
+
+    def update(self, done, errors):
+        self.done += done
+        self.errors += errors
+        now = time.perf_counter()
+        if now - self.reported >= self.report_seconds:
+            self.report()
+            self.reported = now
+
+    def report(self):
+        elapsed = time.perf_counter() - self.began
+        rate = self.done / elapsed if elapsed else 0.0
+        print(
+            f"offset {self.start + self.done}: {self.done} records in {elapsed:.0f}s "
+            f"({rate:.1f}/s), {self.errors} errors",
+            file=sys.stderr,
+            flush=True
+        )
+
+def recognize_archive(input_path, output_path, server_path='server.py', workers=None,
+                      batch_size=16, start=None, report_seconds=10.0):
+    """Render archived boards in a process pool and recognize them in batches
+
+    Boards take the same path as /recognize: word boxes from stroke geometry or whole
+    images, as the server's SEGMENTATION says. Output has one JSON line per input record
+    with the /recognize response, in input order, tagged with the record's offset, so an
+    interrupted run resumes after the last line written. At most a few rendered boards
+    per worker are held in memory at a time.
+    """
+    server = load_server(server_path)
+    missing = [name for name in SERVER_API if not hasattr(server, name)]
+    if missing:
+        raise ServerModuleError(f"{server_path} does not provide the batch pipeline ({', '.join(missing)})")
+    resumed = resume_offset(output_path)
+    if start is None:
+        start = resumed
+    workers = workers or os.cpu_count() or 1
+    batch_size = max(1, int(batch_size))
+
+    print(f"Loading {server.BACKEND_NAME}...", file=sys.stderr, flush=True)
+    backend = build_backend(*server.BACKEND_ARGS)
+
+    progress = Progress(start, report_seconds)
+    if start:
+        print(f"Resuming at record offset {start}", file=sys.stderr, flush=True)
+
+    def recognize_group(recognize, inputs):
+        """Results of one recognizer call over inputs, or the error every record in it reports"""
+        if not inputs:
+            return iter(()), None
+        try:
+            return iter(recognize(inputs)), None
+        except Exception as e:
+            return None, str(e)
+
+    def write_batch(out, batch):
+        # Whole images share one recognizer call, and the word boxes of every board another
+        rendered_ok = [rendered for _, _, rendered, error in batch if error is None]
+        images, image_error = recognize_group(
+            backend.recognize_batch,
+            [rendered[1] for rendered in rendered_ok if rendered[0] == 'image']
+        )
+        decoded, words_error = recognize_group(
+            backend.recognize_box_batch,
+            [(rendered[2], rendered[3]) for rendered in rendered_ok if rendered[0] == 'words']
+        )
+        errors = 0
+        for offset, record_id, rendered, error in batch:
+            output = {'offset': offset}
+            if record_id is not None:
+                output['id'] = record_id
+            if error is None:
+                if rendered[0] == 'image':
+                    error = image_error
+                    if error is None:
+                        output.update(server.results_response(next(images)))
+                else:
+                    error = words_error
+                    if error is None:
+                        output.update(server.words_response(server.decoded_words(rendered[1], next(decoded))))
+            if error is not None:
+                output['error'] = error
+                errors += 1
+            out.write(json.dumps(output) + '\n')
+        out.flush()
+        progress.update(len(batch), errors)
+
+    # Render processes do not fork the threads the server module starts
+    context = multiprocessing.get_context('spawn')
+    max_in_flight = workers * 4
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(server_path,)) as pool, \
+            (contextlib.nullcontext(sys.stdout) if output_path == '-'
+             else open(output_path, 'a', encoding='utf-8')) as out:
+        in_flight = collections.deque()
+        batch = []
+        for offset, line in read_records(input_path, start):
+            in_flight.append(pool.submit(_render, offset, line))
+            if len(in_flight) < max_in_flight:
+                continue
+            batch.append(in_flight.popleft().result())
+            if len(batch) >= batch_size:
+                write_batch(out, batch)
+                batch = []
+        while in_flight:
+            batch.append(in_flight.popleft().result())
+            if len(batch) >= batch_size:
+                write_batch(out, batch)
+                batch = []
+        if batch:
+            write_batch(out, batch)
+
+    backend.close()
+    progress.report()
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recognize archived whiteboard stroke records offline")
+    parser.add_argument('input', help="JSONL (or .jsonl.gz) of /recognize bodies; '-' reads stdin")
+    parser.add_argument('output', help="JSONL results, appended to; '-' writes stdout")
+    parser.add_argument('--server', default='server.py', help="Server module whose pipeline and OCR settings are used")
+    parser.add_argument('--workers', type=int, help="Render processes (default: CPU count)")
+    parser.add_argument('--batch-size', type=int, default=16,
+                        help="Boards per recognizer call (whole images, or all their word boxes)")
+    parser.add_argument('--start', type=int, help="Record offset to start from (default: resume after the output)")
+    parser.add_argument('--report-seconds', type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument('--log-level', default='WARNING', help="Log level for the server module")
+    args = parser.parse_args(argv)
+
+    # Read by the server's logging setup when it is loaded, here and in the render processes
+    os.environ['LOG_LEVEL'] = args.log_level
+    try:
+        return recognize_archive(args.input, args.output, args.server, args.workers,
+                                 args.batch_size, args.start, args.report_seconds)
+    except ServerModuleError as e:
+        parser.error(str(e))
+
+if __name__ == '__main__':
+    sys.exit(main())
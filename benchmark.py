@@ -0,0 +1,631 @@
+import argparse
+import difflib
+import importlib.util
+import json
+import os
+import resource
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from incremental import cluster_strokes
+from model_loader import LazyModel
+from ocr_backends import EasyOCRBackend, OCRBackend
+from ocr_scheduler import BatchScheduler
+from result_cache import ResultCache
+from rasterizer import pack_strokes, rasterize, render_strokes
+from simplify import simplify_strokes
+from preprocessing import STAGES, PreprocessPipeline, detect_text_angle
+from skew import deskew_points, estimate_skew
+from stroke_codec import decode_strokes, encode_strokes
+
+# Largest mean absolute difference (0-255 gray levels) accepted against the legacy renderer
+RASTER_MEAN_TOLERANCE = 2.0
+# Largest fraction of pixels allowed to differ by more than a quarter of the range
+RASTER_OUTLIER_TOLERANCE = 0.01
+
+def load_corpus(path):
+    """Load recorded /recognize payloads from a JSONL file"""
+    payloads = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get('strokes'):
+                payloads.append(record)
+    return payloads
+
+def synthetic_corpus(count=20, strokes_per_board=40, seed=0):
+    """Generate wavy handwriting-like boards when no recorded corpus is available"""
+    rng = np.random.default_rng(seed)
+    payloads = []
+    for _ in range(count):
+        strokes = []
+        for _ in range(strokes_per_board):
+            x0, y0 = rng.uniform(50, 700), rng.uniform(50, 550)
+            steps = int(rng.integers(20, 200))
+            t = np.linspace(0, 2 * np.pi * rng.uniform(0.5, 2), steps)
+            xs = np.clip(x0 + np.cumsum(rng.normal(1, 0.5, steps)), 0, 799)
+            ys = np.clip(y0 + 15 * np.sin(t), 0, 599)
+            strokes.append([[int(x), int(y)] for x, y in zip(xs, ys)])
+        payloads.append({'strokes': strokes, 'gridSize': 40})
+    return payloads
+
+def synthetic_handwriting(lines=4, words_per_line=4, seed=0):
+    """Generate cursive-like words written along horizontal baselines"""
+    rng = np.random.default_rng(seed)
+    strokes = []
+    for line in range(lines):
+        baseline = 120 + 110 * line
+        x = 60.0
+        for _ in range(words_per_line):
+            # One connected stroke of loops per word, like joined-up letters
+            letters = int(rng.integers(3, 7))
+            t = np.linspace(0, 2 * np.pi * letters, 24 * letters)
+            xs = x + t * 4.5 + 6 * np.sin(t)
+            ys = baseline - 14 * (1 - np.cos(t)) / 2 + rng.normal(0, 0.6, len(t))
+            strokes.append(np.stack([xs, ys], axis=1).tolist())
+            x = xs[-1] + 30
+    return strokes
+
+def bench_skew(angles, boards=5):
+    """Angle error and cost of stroke-geometry skew estimation against Hough detection"""
+    print(f"skew: {boards} boards per angle")
+    print(f"  {'angle':>6s} {'strokes err':>12s} {'hough err':>10s} {'strokes ms':>11s} {'hough ms':>9s}")
+    for angle in angles:
+        stroke_errors, hough_errors = [], []
+        stroke_time = hough_time = 0.0
+        for seed in range(boards):
+            points, offsets = pack_strokes(synthetic_handwriting(seed=seed))
+            # Tilt the board so its text runs downhill by the given angle
+            tilted = deskew_points(points, -angle, (400, 300))
+
+            estimate, elapsed = timed(estimate_skew, tilted, offsets)
+            stroke_time += elapsed
+            stroke_errors.append(abs((estimate or 0.0) - angle))
+
+            image = render_strokes(tilted, offsets)
+            detected, elapsed = timed(detect_text_angle, image)
+            hough_time += elapsed
+            hough_errors.append(abs(detected - angle))
+
+        print(f"  {angle:6.1f} {np.mean(stroke_errors):12.2f} {np.mean(hough_errors):10.2f} "
+              f"{1000 * stroke_time / boards:11.2f} {1000 * hough_time / boards:9.2f}")
+
+def printed_word(x, baseline, letters, grid_size, letter_gap):
+    """Strokes of one word: a separate zigzag stroke per letter, letter_gap cells apart"""
+    strokes = []
+    width = 0.5 * grid_size
+    for _ in range(letters):
+        strokes.append([[x, baseline], [x + width / 2, baseline - 0.7 * grid_size], [x + width, baseline]])
+        x += width + letter_gap * grid_size
+    return strokes, x - letter_gap * grid_size
+
+def bench_segment(grid_size=40, boards=5):
+    """Check that word clustering keeps words one grid cell apart and joins a word's letters"""
+    print(f"segment: grid {grid_size}px")
+    ok = True
+    for letter_gap, word_gap in ((0.1, 1.0), (0.3, 1.0), (0.2, 0.6), (0.45, 0.75)):
+        first, end = printed_word(60.0, 200.0, 4, grid_size, letter_gap)
+        second, _ = printed_word(end + word_gap * grid_size, 200.0, 3, grid_size, letter_gap)
+        regions = cluster_strokes(first + second, grid_size)
+        sizes = [len(region['strokes']) for region in regions]
+        passed = sizes == [4, 3]
+        ok = ok and passed
+        print(f"  letters {letter_gap:.2f} cells apart, words {word_gap:.2f} cells apart: "
+              f"{len(regions)} regions of {sizes} strokes {'ok' if passed else 'FAIL (expected [4, 3])'}")
+
+    # Joined-up handwriting: one stroke per word, words 0.75 cells apart
+    found = expected = 0
+    elapsed = 0.0
+    for seed in range(boards):
+        regions, seconds = timed(cluster_strokes, synthetic_handwriting(seed=seed), grid_size)
+        found += len(regions)
+        expected += 16
+        elapsed += seconds
+    passed = found == expected
+    ok = ok and passed
+    print(f"  handwriting: {found} of {expected} words found in {1000 * elapsed / boards:.2f} ms per board "
+          f"{'ok' if passed else 'FAIL'}")
+    return ok
+
+def legacy_rasterize(strokes, size=(400, 300)):
+    """Reference copy of the original per-segment PIL renderer"""
+    img = Image.new('RGB', (1600, 1200), 'white')
+    draw = ImageDraw.Draw(img)
+    scaled_strokes = [[(p[0]*2, p[1]*2) for p in stroke] for stroke in strokes]
+    for stroke in scaled_strokes:
+        if len(stroke) > 1:
+            for offset in [-1, 0, 1]:
+                for i in range(len(stroke)-1):
+                    x1, y1 = stroke[i]
+                    x2, y2 = stroke[i+1]
+                    draw.line([(x1, y1+offset), (x2, y2+offset)], fill='black', width=4)
+    img = img.resize(size, Image.Resampling.LANCZOS)
+    return np.array(img.convert('L'))
+
+def timed(func, *args, **kwargs):
+    """Run func once and return (result, elapsed seconds)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+def bench_raster(payloads, size):
+    """Compare the batched rasterizer against the legacy renderer"""
+    legacy_total = fast_total = 0.0
+    worst_mean = worst_outliers = 0.0
+    for payload in payloads:
+        reference, legacy_time = timed(legacy_rasterize, payload['strokes'], size)
+        image, fast_time = timed(rasterize, payload['strokes'], size)
+        legacy_total += legacy_time
+        fast_total += fast_time
+
+        diff = np.abs(reference.astype(np.int16) - image.astype(np.int16))
+        worst_mean = max(worst_mean, float(diff.mean()))
+        worst_outliers = max(worst_outliers, float((diff > 64).mean()))
+
+    print(f"raster {size[0]}x{size[1]}: {len(payloads)} boards")
+    print(f"  legacy  {1000 * legacy_total / len(payloads):8.2f} ms/board")
+    print(f"  batched {1000 * fast_total / len(payloads):8.2f} ms/board "
+          f"({legacy_total / max(fast_total, 1e-9):.1f}x faster)")
+    print(f"  worst mean abs diff {worst_mean:.3f} (tolerance {RASTER_MEAN_TOLERANCE})")
+    print(f"  worst outlier fraction {worst_outliers:.5f} (tolerance {RASTER_OUTLIER_TOLERANCE})")
+    return worst_mean <= RASTER_MEAN_TOLERANCE and worst_outliers <= RASTER_OUTLIER_TOLERANCE
+
+def bench_simplify(payloads, tolerance, ocr=False):
+    """Point reduction, rasterization speedup and recognition parity of stroke simplification"""
+    reader = None
+    if ocr:
+        import easyocr
+        reader = easyocr.Reader(['en'], recog_network='english_g2', gpu=False)
+
+    before = after = 0
+    full_total = simplified_total = 0.0
+    worst_mean = 0.0
+    text_matches = 0
+    for payload in payloads:
+        points, offsets = pack_strokes(payload['strokes'])
+        full, full_time = timed(render_strokes, points, offsets)
+
+        start = time.perf_counter()
+        simple_points, simple_offsets = simplify_strokes(points, offsets, tolerance)
+        simplified = render_strokes(simple_points, simple_offsets)
+        simplified_time = time.perf_counter() - start
+
+        before += len(points)
+        after += len(simple_points)
+        full_total += full_time
+        simplified_total += simplified_time
+        diff = np.abs(full.astype(np.int16) - simplified.astype(np.int16))
+        worst_mean = max(worst_mean, float(diff.mean()))
+
+        if reader is not None:
+            full_text = ' '.join(r[1] for r in reader.readtext(full, paragraph=True))
+            simple_text = ' '.join(r[1] for r in reader.readtext(simplified, paragraph=True))
+            text_matches += full_text == simple_text
+
+    print(f"simplify tolerance {tolerance}: {len(payloads)} boards")
+    print(f"  points {before} -> {after} ({100.0 * (1 - after / max(before, 1)):.1f}% fewer)")
+    print(f"  raster {1000 * full_total / len(payloads):.2f} -> "
+          f"{1000 * simplified_total / len(payloads):.2f} ms/board "
+          f"({full_total / max(simplified_total, 1e-9):.1f}x, including simplification)")
+    print(f"  worst mean abs diff {worst_mean:.3f}")
+    if reader is not None:
+        print(f"  identical OCR text on {text_matches}/{len(payloads)} boards")
+
+def bench_codec(payloads, rounds=20):
+    """Bytes on the wire and parse time of JSON against the binary stroke format"""
+    json_bodies = [json.dumps({'strokes': payload['strokes']}).encode('utf-8') for payload in payloads]
+    raw_bodies = [encode_strokes(payload['strokes'], compress=False) for payload in payloads]
+    zlib_bodies = [encode_strokes(payload['strokes']) for payload in payloads]
+
+    def parse_json(body):
+        return pack_strokes(json.loads(body)['strokes'])
+
+    def parse_binary(body):
+        strokes = decode_strokes(body)
+        return strokes.points, strokes.offsets
+
+    print(f"codec: {len(payloads)} boards, {rounds} rounds")
+    for name, bodies, parse in [
+        ('json', json_bodies, parse_json),
+        ('binary', raw_bodies, parse_binary),
+        ('binary+zlib', zlib_bodies, parse_binary)
+    ]:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for body in bodies:
+                parse(body)
+        elapsed = (time.perf_counter() - start) / (rounds * len(bodies))
+        size = sum(len(body) for body in bodies) / len(bodies)
+        print(f"  {name:12s} {size / 1024:8.1f} KB/board {1000 * elapsed:8.3f} ms/parse")
+
+# Preprocessing configurations compared by the 'preprocess' command
+PREPROCESS_VARIANTS = {
+    'legacy': ({stage: 'on' for stage in STAGES}, False),
+    'default': ({}, True),
+    'minimal': ({'enhance': 'off', 'deskew': 'off', 'denoise': 'off', 'clahe': 'off'}, True)
+}
+
+def ink_iou(a, b):
+    """Intersection over union of the dark pixels of two binarized images"""
+    ink_a = np.asarray(a) < 128
+    ink_b = np.asarray(b) < 128
+    union = np.logical_or(ink_a, ink_b).sum()
+    return np.logical_and(ink_a, ink_b).sum() / union if union else 1.0
+
+def bench_preprocess(payloads, ocr=False):
+    """Latency per preprocessing stage against agreement with the legacy all-stages pipeline"""
+    reader = None
+    if ocr:
+        import easyocr
+        reader = easyocr.Reader(['en'], recog_network='english_g2', gpu=False)
+
+    images = [rasterize(payload['strokes']) for payload in payloads]
+    outputs = {}
+    print(f"preprocess: {len(payloads)} boards")
+    for name, (modes, synthetic) in PREPROCESS_VARIANTS.items():
+        pipeline = PreprocessPipeline(modes)
+        start = time.perf_counter()
+        outputs[name] = [pipeline.run(image, synthetic=synthetic)[0] for image in images]
+        elapsed = (time.perf_counter() - start) / len(images)
+
+        iou = np.mean([ink_iou(a, b) for a, b in zip(outputs['legacy'], outputs[name])])
+        stages = ' '.join(
+            f"{stage}={stats['mean_ms']:.2f}" for stage, stats in pipeline.stats().items() if stats['runs']
+        )
+        print(f"  {name:8s} {1000 * elapsed:7.2f} ms/board  ink IoU vs legacy {iou:.3f}  [{stages}]")
+
+        if reader is not None:
+            matches = 0
+            for payload, legacy, image in zip(payloads, outputs['legacy'], outputs[name]):
+                expected = payload.get('text') or ' '.join(
+                    r[1] for r in reader.readtext(np.array(legacy), paragraph=True))
+                got = ' '.join(r[1] for r in reader.readtext(np.array(image), paragraph=True))
+                matches += got == expected
+            print(f"           OCR text matches on {matches}/{len(payloads)} boards")
+
+def bench_quantize(payloads, threads=None, max_drop=0.02):
+    """Latency and accuracy of int8 against float EasyOCR on the CPU; False if int8 loses too much
+
+    Boards labeled with 'text' are scored against the label; otherwise int8 output is
+    scored against the float output.
+    """
+    pipeline = PreprocessPipeline()
+    images = [np.array(pipeline.run(rasterize(payload['strokes']), synthetic=True)[0]) for payload in payloads]
+    labels = [payload.get('text') for payload in payloads]
+    labeled = all(labels)
+
+    texts = {}
+    print(f"quantize: {len(payloads)} boards, {threads or 'default'} threads, "
+          f"{'labeled' if labeled else 'unlabeled, scored against float'}")
+    for precision in ('float', 'int8'):
+        backend = EasyOCRBackend(
+            ['en'],
+            reader_options={'recog_network': 'english_g2', 'gpu': False},
+            readtext_options={'paragraph': True},
+            decoding='greedy',
+            precision=precision,
+            threads=threads
+        ).load().warmup()
+        samples = []
+        texts[precision] = []
+        for image in images:
+            results, seconds = timed(backend.recognize_batch, [image])
+            samples.append(seconds)
+            texts[precision].append(' '.join(result[1] for result in results[0]))
+        p50, p95, _ = percentiles(samples)
+        line = f"  {precision:5s} p50 {p50:8.2f}  p95 {p95:8.2f} ms/board"
+        if labeled:
+            correct = sum(text == label for text, label in zip(texts[precision], labels))
+            line += f"  exact {correct}/{len(payloads)}"
+        print(line)
+        backend.close()
+
+    agree = sum(a == b for a, b in zip(texts['float'], texts['int8']))
+    similarity = np.mean([
+        difflib.SequenceMatcher(None, a, b).ratio() for a, b in zip(texts['float'], texts['int8'])
+    ])
+    print(f"  int8 agrees with float on {agree}/{len(payloads)} boards, mean character similarity {similarity:.3f}")
+
+    if labeled:
+        drop = sum(
+            (f == label) - (q == label) for f, q, label in zip(texts['float'], texts['int8'], labels)
+        ) / len(payloads)
+    else:
+        drop = 1 - agree / len(payloads)
+    passed = drop <= max_drop
+    print(f"  accuracy drop {drop:.3f} (limit {max_drop}): {'ok' if passed else 'FAILED'}")
+    return passed
+
+# Runs in a fresh interpreter so import costs are not hidden by already loaded modules
+STARTUP_SCRIPT = """
+import importlib.util, json, sys, time
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location('server', sys.argv[1])
+server = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(server)
+imported = time.perf_counter() - start
+ready = server.ocr_model.wait(float(sys.argv[2]))
+print(json.dumps({'import': imported, 'ready': time.perf_counter() - start if ready else None,
+                  'status': server.ocr_model.status()}))
+"""
+
+def bench_startup(path, timeout):
+    """Time until the server module is importable (healthy) and until its model is loaded (ready)"""
+    output = subprocess.run(
+        [sys.executable, '-c', STARTUP_SCRIPT, path, str(timeout)],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(path))
+    )
+    if output.returncode != 0:
+        print(output.stderr.strip().splitlines()[-1] if output.stderr.strip() else "startup failed")
+        return 1
+
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    print(f"startup {path}")
+    print(f"  healthy after {1000 * result['import']:8.1f} ms (module imported)")
+    if result['ready'] is not None:
+        print(f"  ready after   {1000 * result['ready']:8.1f} ms (model loaded)")
+    else:
+        print(f"  not ready: {result['status']}")
+    return 0
+
+class StubReader(OCRBackend):
+    """CPU stand-in OCR backend with a fixed per-call cost plus a per-image cost"""
+
+    name = 'stub'
+
+    def __init__(self, call_ms=40.0, image_ms=5.0):
+        self.call_ms = call_ms
+        self.image_ms = image_ms
+        self.calls = 0
+
+    def recognize_batch(self, images):
+        self.calls += 1
+        time.sleep((self.call_ms + self.image_ms * len(images)) / 1000.0)
+        return [[([[0, 0], [1, 0], [1, 1], [0, 1]], 'stub', 1.0)] for _ in images]
+
+def bench_scheduler(payloads, requests, concurrency, max_batch_size, max_wait_ms):
+    """Measure request throughput through the batch scheduler against unbatched calls"""
+    images = [rasterize(payload['strokes']) for payload in payloads]
+
+    def run(batch_size):
+        stub = StubReader()
+        scheduler = BatchScheduler(stub.recognize_batch, max_batch_size=batch_size, max_wait_ms=max_wait_ms)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda i: scheduler.recognize(images[i % len(images)]), range(requests)))
+        elapsed = time.perf_counter() - start
+        scheduler.close()
+        return elapsed, stub.calls, scheduler.stats()
+
+    baseline, baseline_calls, _ = run(1)
+    batched, batched_calls, stats = run(max_batch_size)
+    print(f"scheduler: {requests} requests, concurrency {concurrency}")
+    print(f"  unbatched {requests / baseline:8.1f} req/s ({baseline_calls} model calls)")
+    print(f"  batched   {requests / batched:8.1f} req/s ({batched_calls} model calls, "
+          f"{baseline / batched:.1f}x)")
+    print(f"  batch sizes  {stats['batch_size_histogram']}")
+    print(f"  queue depths {stats['queue_depth_histogram']}")
+
+class StageTimer:
+    """Collect per-call latencies of named pipeline stages from any thread"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage, func):
+        def timed_stage(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - start)
+        return timed_stage
+
+    def reset(self):
+        with self._lock:
+            self.samples = {}
+
+class TimedReader:
+    """Backend proxy that times recognition calls as the 'ocr' stage"""
+
+    def __init__(self, backend, timer):
+        self.backend = backend
+        self.recognize_batch = timer.wrap('ocr', backend.recognize_batch)
+        self.recognize_boxes = timer.wrap('ocr', backend.recognize_boxes)
+        self.recognize_box_batch = timer.wrap('ocr', backend.recognize_box_batch)
+
+# Server functions timed as stages when replaying in-process; missing ones are skipped
+REPLAY_STAGES = ('render_board', 'simplify_strokes', 'correct_skew', 'render_box', 'preprocess_image', 'segment_words')
+
+def load_server(path, timer, stub, cache):
+    """Import a server module with its stages timed and, optionally, a stub OCR model"""
+    spec = importlib.util.spec_from_file_location('replay_server', path)
+    server = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(server)
+
+    for stage in REPLAY_STAGES:
+        if hasattr(server, stage):
+            setattr(server, stage, timer.wrap(stage, getattr(server, stage)))
+    if not cache:
+        # Replays repeat boards; a cache hit would hide the pipeline being measured
+        server.result_cache = ResultCache(max_entries=0)
+
+    if hasattr(server, 'reader_pool'):
+        factory = server.reader_pool.factory
+        server.reader_pool.factory = lambda lang: TimedReader(stub or factory(lang), timer)
+    if hasattr(server, 'ocr_model'):
+        factory = server.ocr_model.factory
+        server.ocr_model = LazyModel('stub' if stub else server.ocr_model.name,
+                                     lambda: TimedReader(stub or factory(), timer))
+    return server
+
+def percentiles(samples):
+    """p50/p95/p99 of a list of seconds, in milliseconds"""
+    return 1000 * np.percentile(np.asarray(samples), [50, 95, 99])
+
+def peak_rss_mb():
+    """Peak resident set size of this process (ru_maxrss is KiB on Linux, bytes on macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def bench_replay(payloads, requests, concurrency_levels, url=None, server_path='server.py',
+                 stub=True, cache=False, timeout=300.0):
+    """Replay /recognize payloads in-process or over HTTP and report latency, throughput and memory"""
+    timer = StageTimer()
+    bodies = [json.dumps(payload).encode() for payload in payloads]
+
+    if url:
+        endpoint = url.rstrip('/') + '/recognize'
+
+        def send(body):
+            req = urllib.request.Request(endpoint, data=body, headers={'Content-Type': 'application/json'})
+            with urllib.request.urlopen(req, timeout=timeout) as response:
+                response.read()
+                return response.status
+    else:
+        server = load_server(server_path, timer, StubReader() if stub else None, cache)
+        local = threading.local()
+
+        def send(body):
+            # Flask test clients are not shared between threads
+            if not hasattr(local, 'client'):
+                local.client = server.app.test_client()
+            return local.client.post('/recognize', data=body, content_type='application/json').status_code
+
+        if hasattr(server, 'ocr_model') and not server.ocr_model.wait(timeout):
+            print(f"OCR model not ready: {server.ocr_model.status()}")
+            return 1
+
+    def request(i):
+        start = time.perf_counter()
+        status = send(bodies[i % len(bodies)])
+        timer.record('total', time.perf_counter() - start)
+        return status
+
+    # One pass to load models and readers before anything is timed
+    for i in range(min(len(bodies), 3)):
+        request(i)
+
+    target = url or f"{server_path} in-process" + (" (stub OCR)" if stub else "")
+    print(f"replay {target}: {len(payloads)} boards, {requests} requests per level")
+    for concurrency in concurrency_levels:
+        timer.reset()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            statuses = list(pool.map(request, range(requests)))
+        elapsed = time.perf_counter() - start
+
+        errors = sum(1 for status in statuses if status != 200)
+        print(f"  concurrency {concurrency}: {requests / elapsed:8.1f} req/s, {errors} errors")
+        for stage in ('total',) + REPLAY_STAGES + ('ocr',):
+            samples = timer.samples.get(stage)
+            if samples:
+                p50, p95, p99 = percentiles(samples)
+                print(f"    {stage:<17} p50 {p50:8.2f}  p95 {p95:8.2f}  p99 {p99:8.2f} ms  (n={len(samples)})")
+
+    if url:
+        print(f"  peak RSS {peak_rss_mb():.1f} MB (client only; server stages and memory are not visible over HTTP)")
+    else:
+        print(f"  peak RSS {peak_rss_mb():.1f} MB")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="AI Whiteboard recognition pipeline benchmarks")
+    parser.add_argument('--corpus', help="JSONL file of recorded /recognize payloads")
+    parser.add_argument('--boards', type=int, default=20, help="Synthetic boards when no corpus is given")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    raster = subparsers.add_parser('raster', help="Rasterizer speed and parity with the legacy renderer")
+    raster.add_argument('--size', default='400x300', help="Output size, e.g. 400x300 or 800x600")
+
+    scheduler = subparsers.add_parser('scheduler', help="Micro-batching throughput with a stub reader")
+    scheduler.add_argument('--requests', type=int, default=200)
+    scheduler.add_argument('--concurrency', type=int, default=16)
+    scheduler.add_argument('--max-batch-size', type=int, default=8)
+    scheduler.add_argument('--max-wait-ms', type=float, default=10.0)
+
+    simplify = subparsers.add_parser('simplify', help="Stroke simplification point reduction and parity")
+    simplify.add_argument('--tolerance', type=float, default=0.75, help="RDP tolerance in board pixels")
+    simplify.add_argument('--ocr', action='store_true', help="Also compare EasyOCR output (needs easyocr)")
+
+    codec = subparsers.add_parser('codec', help="JSON against binary stroke upload size and parse time")
+    codec.add_argument('--rounds', type=int, default=20)
+
+    preprocess = subparsers.add_parser('preprocess', help="Preprocessing stage latency and accuracy")
+    preprocess.add_argument('--ocr', action='store_true', help="Also compare EasyOCR output (needs easyocr)")
+
+    skew = subparsers.add_parser('skew', help="Skew estimate accuracy on synthetically rotated handwriting")
+    skew.add_argument('--angles', default='-10,-5,-2,0,2,5,10', help="Comma-separated rotation angles in degrees")
+
+    subparsers.add_parser('segment', help="Word clustering keeps separate words apart")
+
+    quantize = subparsers.add_parser('quantize', help="int8 against float EasyOCR latency and accuracy (needs easyocr)")
+    quantize.add_argument('--threads', type=int, help="Intra-op CPU threads for both models")
+    quantize.add_argument('--max-accuracy-drop', type=float, default=0.02,
+                          help="Largest accepted fraction of boards int8 gets wrong that float gets right")
+
+    startup = subparsers.add_parser('startup', help="Time to healthy and ready for server.py")
+    startup.add_argument('--server', default='server.py')
+    startup.add_argument('--timeout', type=float, default=300.0, help="Seconds to wait for the model")
+
+    replay = subparsers.add_parser('replay', help="Replay payloads end to end with per-stage latency")
+    replay.add_argument('--url', help="Replay over HTTP against a running server instead of in-process")
+    replay.add_argument('--server', default='server.py', help="Server module to load in-process")
+    replay.add_argument('--requests', type=int, default=100, help="Requests per concurrency level")
+    replay.add_argument('--concurrency', default='1,4,16', help="Comma-separated concurrency levels")
+    replay.add_argument('--real-ocr', action='store_true', help="Use the real OCR model instead of a stub")
+    replay.add_argument('--cache', action='store_true', help="Leave the result cache enabled")
+    replay.add_argument('--timeout', type=float, default=300.0, help="Seconds to wait for the model")
+    replay.add_argument('--log-level', default='WARNING', help="Log level for the in-process server")
+
+    args = parser.parse_args(argv)
+    if args.command == 'startup':
+        return bench_startup(args.server, args.timeout)
+
+    payloads = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.boards)
+    if not payloads:
+        print("No payloads with strokes found")
+        return 1
+
+    if args.command == 'raster':
+        size = tuple(int(v) for v in args.size.split('x'))
+        return 0 if bench_raster(payloads, size) else 1
+    if args.command == 'simplify':
+        bench_simplify(payloads, args.tolerance, args.ocr)
+    if args.command == 'codec':
+        bench_codec(payloads, args.rounds)
+    if args.command == 'preprocess':
+        bench_preprocess(payloads, args.ocr)
+    if args.command == 'quantize':
+        return 0 if bench_quantize(payloads, args.threads, args.max_accuracy_drop) else 1
+    if args.command == 'segment':
+        return 0 if bench_segment() else 1
+    if args.command == 'skew':
+        bench_skew([float(a) for a in args.angles.split(',')], args.boards)
+    if args.command == 'replay':
+        # Read by the server's logging setup when it is loaded in-process
+        os.environ['LOG_LEVEL'] = args.log_level
+        return bench_replay(payloads, args.requests, [int(c) for c in args.concurrency.split(',')],
+                            args.url, args.server, not args.real_ocr, args.cache, args.timeout)
+    if args.command == 'scheduler':
+        bench_scheduler(payloads, args.requests, args.concurrency,
+                        args.max_batch_size, args.max_wait_ms)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+
+import pygame
+
+class GlyphCache:
+    """Rendered text surfaces keyed on (text, color), least recently used evicted first"""
+
+    def __init__(self, font, max_entries=512):
+        self.font = font
+        self.max_entries = max(1, int(max_entries))
+        self._surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, text, color):
+        key = (text, tuple(color))
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = self.font.render(text, True, color)
+        self._surfaces[key] = surface
+        while len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return surface
+
+class BoardRenderer:
+    """Retained-mode drawing of ink and recognized text that only updates what changed
+
+    Ink is drawn a segment at a time as points arrive. Text is blitted once from the glyph
+    cache when it is recognized. A stroke that stops being shown, because its text arrived
+    or its job was dropped, has its bounding box repainted from the retained text and ink.
+    present() pushes just the changed rectangles to the display.
+    """
+
+    def __init__(self, screen, font, background, ink, ink_width=2, glyph_cache_size=512):
+        self.screen = screen
+        self.background = background
+        self.ink = ink
+        self.ink_width = ink_width
+        self.glyphs = GlyphCache(font, glyph_cache_size)
+
+        # Recognized text as parallel lists, so repaints can use Rect.collidelistall
+        self._text_surfaces = []
+        self._text_rects = []
+        # id(stroke) -> [stroke, bounding rect or None until a segment is drawn]
+        self._strokes = {}
+        self._dirty = []
+        self.frames = 0
+        self.updated_rects = 0
+        self.repaints = 0
+
+        self.clear()
+
+    def extend(self, stroke, point):
+        """Append point to stroke and draw only the new segment"""
+        stroke.append(point)
+        entry = self._strokes.setdefault(id(stroke), [stroke, None])
+        if len(stroke) > 1:
+            rect = pygame.draw.line(self.screen, self.ink, stroke[-2], stroke[-1], self.ink_width)
+            entry[1] = rect if entry[1] is None else entry[1].union(rect)
+            self._dirty.append(rect)
+
+    def sync_strokes(self, strokes):
+        """Show exactly these strokes as ink, repainting where strokes were removed"""
+        shown = {id(stroke): stroke for stroke in strokes}
+        for key in [key for key in self._strokes if key not in shown]:
+            _, rect = self._strokes.pop(key)
+            if rect is not None:
+                self._repaint(rect)
+        for key, stroke in shown.items():
+            if key not in self._strokes:
+                self._strokes[key] = [stroke, self._draw_stroke(stroke)]
+
+    def add_text(self, text, position, color):
+        """Draw recognized text centered on position and keep it for later repaints"""
+        surface = self.glyphs.render(text, color)
+        rect = surface.get_rect(center=(int(position[0]), int(position[1])))
+        self._text_surfaces.append(surface)
+        self._text_rects.append(rect)
+        self.screen.blit(surface, rect)
+        self._dirty.append(rect)
+
+    def clear(self):
+        """Forget all text and ink and repaint the whole board"""
+        self._text_surfaces = []
+        self._text_rects = []
+        self._strokes = {}
+        self.screen.fill(self.background)
+        self._dirty = [self.screen.get_rect()]
+
+    def present(self):
+        """Update the changed parts of the display; returns how many rectangles were pushed"""
+        self.frames += 1
+        if not self._dirty:
+            return 0
+        rects = self._dirty
+        self._dirty = []
+        pygame.display.update(rects)
+        self.updated_rects += len(rects)
+        return len(rects)
+
+    def stats(self):
+        return {
+            'texts': len(self._text_rects),
+            'strokes': len(self._strokes),
+            'rects_per_frame': round(self.updated_rects / self.frames, 2) if self.frames else 0.0,
+            'repaints': self.repaints,
+            'glyph_hits': self.glyphs.hits,
+            'glyph_misses': self.glyphs.misses
+        }
+
+    def _draw_stroke(self, stroke):
+        if len(stroke) < 2:
+            return None
+        rect = pygame.draw.lines(self.screen, self.ink, False, stroke, self.ink_width)
+        self._dirty.append(rect)
+        return rect
+
+    def _repaint(self, rect):
+        """Redraw one region from the retained text and ink"""
+        # Thick lines can reach a pixel past the rect pygame reports
+        rect = rect.inflate(self.ink_width * 2, self.ink_width * 2).clip(self.screen.get_rect())
+        self.repaints += 1
+        self.screen.set_clip(rect)
+        self.screen.fill(self.background)
+        for index in rect.collidelistall(self._text_rects):
+            self.screen.blit(self._text_surfaces[index], self._text_rects[index])
+        for stroke, stroke_rect in self._strokes.values():
+            if stroke_rect is not None and rect.colliderect(stroke_rect):
+                pygame.draw.lines(self.screen, self.ink, False, stroke, self.ink_width)
+        self.screen.set_clip(None)
+        self._dirty.append(rect)
@@ -0,0 +1,143 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from rasterizer import pack_strokes
+from result_cache import stroke_key
+
+logger = logging.getLogger(__name__)
+
+def stroke_boxes(points, offsets):
+    """Bounding box (x0, y0, x1, y1) of every non-empty stroke, plus the stroke indices kept"""
+    lengths = np.diff(offsets)
+    keep = np.flatnonzero(lengths > 0)
+    if len(keep) == 0:
+        return np.empty((0, 4), dtype=np.float32), keep
+
+    starts = offsets[:-1][keep]
+    mins = np.minimum.reduceat(points, starts, axis=0)
+    maxs = np.maximum.reduceat(points, starts, axis=0)
+    return np.hstack([mins, maxs]), keep
+
+def merge_overlapping(boxes, gap_x, gap_y):
+    """Label boxes at most gap_x apart horizontally and gap_y vertically as one connected group"""
+    count = len(boxes)
+    labels = np.arange(count)
+    if count < 2:
+        return labels
+
+    # Padding each box by half the gap makes boxes exactly the gap apart just touch
+    pad_x, pad_y = gap_x / 2, gap_y / 2
+    padded = boxes + np.array([-pad_x, -pad_y, pad_x, pad_y], dtype=np.float32)
+    overlap = (
+        (padded[:, None, 0] <= padded[None, :, 2]) & (padded[None, :, 0] <= padded[:, None, 2]) &
+        (padded[:, None, 1] <= padded[None, :, 3]) & (padded[None, :, 1] <= padded[:, None, 3])
+    )
+
+    # Propagate the smallest label through the overlap graph until it settles
+    while True:
+        spread = np.where(overlap, labels[None, :], count).min(axis=1)
+        if np.array_equal(spread, labels):
+            return labels
+        labels = spread
+
+def cluster_strokes(strokes, grid_size=40):
+    """Group strokes into word-sized regions in reading order"""
+    points, offsets = pack_strokes(strokes)
+    boxes, indices = stroke_boxes(points, offsets)
+    if len(boxes) == 0:
+        return []
+
+    # Letters of one word sit closer than half a grid cell apart
+    labels = merge_overlapping(boxes, gap_x=0.5 * grid_size, gap_y=0.4 * grid_size)
+
+    regions = []
+    for label in np.unique(labels):
+        members = np.flatnonzero(labels == label)
+        box = np.concatenate([boxes[members, :2].min(axis=0), boxes[members, 2:].max(axis=0)])
+        regions.append({
+            'strokes': [strokes[i] for i in indices[members].tolist()],
+            'box': [float(v) for v in box]
+        })
+
+    # Reading order: by grid line, then left to right
+    regions.sort(key=lambda r: (round((r['box'][1] + r['box'][3]) / 2 / grid_size), r['box'][0]))
+    return regions
+
+class IncrementalRecognizer:
+    """Remember per-region results for each board session and only re-recognize changed regions"""
+
+    def __init__(self, recognize_regions, max_sessions=256, ttl=1800):
+        # recognize_regions(regions, grid_size) returns one text per region
+        self.recognize_regions = recognize_regions
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.regions_recognized = 0
+        self.regions_reused = 0
+
+    def recognize(self, session_id, strokes, grid_size=40, language='en', recognize_regions=None):
+        """Recognize a board, reusing region results remembered from the session's last request"""
+        recognize_regions = recognize_regions or self.recognize_regions
+        regions = cluster_strokes(strokes, grid_size)
+        for region in regions:
+            region['key'] = stroke_key(region['strokes'], grid_size, language)
+
+        previous = self._session(session_id)
+        changed = [region for region in regions if region['key'] not in previous]
+        for region in regions:
+            if region['key'] in previous:
+                region['text'] = previous[region['key']]
+
+        if changed:
+            texts = recognize_regions(changed, grid_size)
+            for region, text in zip(changed, texts):
+                region['text'] = text
+
+        with self._lock:
+            # Only the current regions are kept so erased words do not linger
+            self._sessions[session_id] = {
+                'regions': {region['key']: region['text'] for region in regions},
+                'last_used': time.time()
+            }
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            self.regions_recognized += len(changed)
+            self.regions_reused += len(regions) - len(changed)
+
+        logger.debug("Incremental recognition: %d of %d regions changed", len(changed), len(regions))
+        return [
+            {'box': region['box'], 'text': region['text']}
+            for region in regions
+        ], len(changed)
+
+    def forget(self, session_id):
+        """Drop the remembered regions of a board session"""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def stats(self):
+        """Snapshot of session and reuse counters"""
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'regions_recognized': self.regions_recognized,
+                'regions_reused': self.regions_reused
+            }
+
+    def _session(self, session_id):
+        """Remembered region results for a session, or an empty dict if unknown or expired"""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return {}
+            if time.time() - session['last_used'] > self.ttl:
+                del self._sessions[session_id]
+                return {}
+            return session['regions']
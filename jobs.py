@@ -0,0 +1,145 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFull(RuntimeError):
+    """Raised when too many jobs are already waiting for a worker"""
+
+class Job:
+    """A background recognition with an append-only list of progress events"""
+
+    def __init__(self):
+        self.id = uuid.uuid4().hex
+        self.status = 'queued'
+        self.created = time.time()
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.events = []
+        self._cond = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed')
+
+    def publish(self, event, data):
+        """Append a progress event and wake up stream readers"""
+        with self._cond:
+            self.events.append((event, data))
+            self._cond.notify_all()
+
+    def wait_events(self, since, timeout=None):
+        """Events after index since, waiting up to timeout for new ones; also returns whether the job is done"""
+        with self._cond:
+            if len(self.events) <= since and not self.done:
+                self._cond.wait(timeout)
+            return self.events[since:], self.done
+
+    def snapshot(self):
+        """JSON-friendly view of the job for polling clients"""
+        with self._cond:
+            return {
+                'jobId': self.id,
+                'status': self.status,
+                'partial': [data for event, data in self.events if event == 'region'],
+                'result': self.result,
+                'error': self.error
+            }
+
+    def _start(self):
+        with self._cond:
+            self.status = 'running'
+            self.events.append(('status', {'status': 'running'}))
+            self._cond.notify_all()
+
+    def _finish(self, status, result=None, error=None):
+        with self._cond:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+            self.events.append(('done', {'status': status, 'result': result, 'error': error}))
+            self._cond.notify_all()
+
+class JobManager:
+    """Run jobs on a bounded worker pool and keep finished ones around for a while"""
+
+    def __init__(self, max_workers=4, max_pending=64, ttl=600):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, func, *args):
+        """Queue func(job, *args) and return its Job; the return value becomes the job result"""
+        with self._lock:
+            self._expire()
+            pending = sum(1 for job in self._jobs.values() if not job.done)
+            if pending >= self.max_workers + self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull("Too many recognition jobs in flight")
+            job = Job()
+            self._jobs[job.id] = job
+            self.submitted += 1
+
+        # Run in a copy of the caller's context so its trace ID follows the job into the worker
+        self._executor.submit(contextvars.copy_context().run, self._run, job, func, args)
+        return job
+
+    def get(self, job_id):
+        """Look up a job by ID, or None if unknown or expired"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        """Snapshot of job counters"""
+        with self._lock:
+            statuses = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            return {
+                'jobs': statuses,
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected
+            }
+
+    def _run(self, job, func, args):
+        job._start()
+        try:
+            result = func(job, *args)
+        except Exception as e:
+            logger.error(f"Error in job {job.id}: {str(e)}")
+            job._finish('failed', error=str(e))
+            with self._lock:
+                self.failed += 1
+            return
+        job._finish('done', result=result)
+        with self._lock:
+            self.completed += 1
+
+    def _expire(self):
+        """Forget finished jobs older than the TTL"""
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.done and now - job.finished > self.ttl
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
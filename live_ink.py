@@ -0,0 +1,162 @@
+import json
+import logging
+import time
+import uuid
+
+from rasterizer import MAX_BOARD_EXTENT, check_grid_size
+
+logger = logging.getLogger(__name__)
+
+try:
+    from flask_sock import Sock
+except ImportError:
+    Sock = None
+
+class LiveInkError(ValueError):
+    """Raised for a live-ink message the board cannot apply"""
+
+class LiveBoard:
+    """Board state of one live-ink connection, built from stroke deltas
+
+    Clients send {"type": "begin"}, {"type": "points", "points": [[x, y], ...]} and
+    {"type": "end"} while writing, plus "clear", "undo", "config" and "recognize".
+    """
+
+    def __init__(self, grid_size=40, language='en', max_points=100000):
+        self.grid_size = grid_size
+        self.language = language
+        self.max_points = max_points
+        self.strokes = []
+        self.current = None
+        self.points = 0
+        # Bumped on every change so clients can tell which board a result belongs to
+        self.version = 0
+
+    def apply(self, message):
+        """Apply one client message; True if recognition was requested right away"""
+        kind = message.get('type')
+        if kind == 'begin':
+            # A stroke whose end was never sent is closed rather than leaked from the count
+            self._end_stroke()
+            self.current = []
+            self._add_points(message.get('points', []))
+        elif kind == 'points':
+            if self.current is None:
+                raise LiveInkError('points sent outside a stroke')
+            self._add_points(message.get('points', []))
+        elif kind == 'end':
+            self._end_stroke()
+        elif kind == 'undo':
+            if self.strokes:
+                self.points -= len(self.strokes.pop())
+                self.version += 1
+        elif kind == 'clear':
+            self.strokes = []
+            self.current = None
+            self.points = 0
+            self.version += 1
+        elif kind == 'config':
+            self.grid_size = check_grid_size(message.get('gridSize', self.grid_size))
+            self.language = message.get('language', self.language)
+            self.version += 1
+        elif kind == 'recognize':
+            return True
+        else:
+            raise LiveInkError(f"unknown message type: {kind}")
+        return False
+
+    def _end_stroke(self):
+        """Keep the open stroke if it has a segment, otherwise drop it and its points"""
+        if self.current is not None and len(self.current) > 1:
+            self.strokes.append(self.current)
+            self.version += 1
+        elif self.current is not None:
+            self.points -= len(self.current)
+        self.current = None
+
+    def _add_points(self, points):
+        if self.points + len(points) > self.max_points:
+            raise LiveInkError(f"board exceeds {self.max_points} points")
+        added = []
+        for point in points:
+            if len(point) != 2:
+                raise LiveInkError('points must be [x, y] pairs')
+            x, y = float(point[0]), float(point[1])
+            # Same bound as /recognize, so a stray point cannot blow up the render
+            if not (abs(x) <= MAX_BOARD_EXTENT and abs(y) <= MAX_BOARD_EXTENT):
+                raise LiveInkError(f"points must lie within {MAX_BOARD_EXTENT} board pixels of the origin")
+            added.append([x, y])
+        self.current.extend(added)
+        self.points += len(added)
+
+def serve_connection(ws, session_id, recognize, debounce_seconds=0.5, max_points=100000):
+    """Read deltas from a WebSocket and push a recognition after every idle pause
+
+    recognize(session_id, board) runs on the connection's own thread and returns a dict
+    that is sent back as a "result" message. Messages that arrive meanwhile wait in the
+    socket's queue, so at most one recognition per connection runs at a time.
+    """
+    board = LiveBoard(max_points=max_points)
+    recognized_version = 0
+    deadline = None
+
+    while True:
+        timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+        data = ws.receive(timeout)
+        if data is None:
+            # Idle long enough since the last finished stroke
+            deadline = None
+            if board.version != recognized_version and board.strokes:
+                recognized_version = board.version
+                _push_result(ws, session_id, recognize, board)
+            continue
+
+        try:
+            message = json.loads(data)
+            if not isinstance(message, dict):
+                raise LiveInkError('messages must be JSON objects')
+            immediate = board.apply(message)
+        except (ValueError, TypeError) as e:
+            _send(ws, {'type': 'error', 'error': f'Invalid message: {str(e)}'})
+            continue
+
+        if immediate:
+            deadline = None
+            recognized_version = board.version
+            _push_result(ws, session_id, recognize, board)
+        elif board.current is not None:
+            # Never recognize a half-written stroke
+            deadline = None
+        elif board.version != recognized_version:
+            deadline = time.monotonic() + debounce_seconds
+
+def _push_result(ws, session_id, recognize, board):
+    try:
+        result = recognize(session_id, board)
+    except Exception as e:
+        logger.error(f"Error in live recognition: {str(e)}")
+        _send(ws, {'type': 'error', 'error': f'Error processing board: {str(e)}', 'version': board.version})
+        return
+    _send(ws, dict(result, type='result', version=board.version))
+
+def _send(ws, payload):
+    ws.send(json.dumps(payload))
+
+def install(app, recognize, forget=None, debounce_seconds=0.5, max_points=100000, route='/ws/ink'):
+    """Serve live ink on a WebSocket route if flask-sock is installed; returns whether it is"""
+    if Sock is None:
+        logger.warning(f"flask-sock is not installed; {route} is disabled")
+        return False
+
+    sock = Sock(app)
+
+    @sock.route(route)
+    def live_ink(ws):
+        session_id = f"live-{uuid.uuid4().hex}"
+        try:
+            serve_connection(ws, session_id, recognize, debounce_seconds, max_points)
+        finally:
+            if forget is not None:
+                forget(session_id)
+
+    return True
@@ -0,0 +1,75 @@
+import json
+import logging
+import random
+import time
+
+from metrics import TraceIdFilter
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(trace_id)s] %(name)s: %(message)s'
+
+def summarize_strokes(strokes, body_bytes=None):
+    """Stroke count, point count and body size of a request instead of its raw coordinates"""
+    if hasattr(strokes, 'offsets'):
+        # Packed strokes from the binary body already know their sizes
+        summary = {'strokes': len(strokes), 'points': int(len(strokes.points))}
+    else:
+        summary = {'strokes': len(strokes), 'points': sum(len(stroke) for stroke in strokes)}
+    if body_bytes is not None:
+        summary['bytes'] = body_bytes
+    return summary
+
+def summarize_results(results):
+    """Number of OCR results and recognized characters instead of the full result list"""
+    results = results or []
+    return {'results': len(results), 'chars': sum(len(result[1]) for result in results)}
+
+class SamplingFilter(logging.Filter):
+    """Keep only a random fraction of records at or below a verbose level"""
+
+    def __init__(self, rate=1.0, max_level=logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.max_level = max_level
+
+    def filter(self, record):
+        if record.levelno > self.max_level or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+class TextFormatter(logging.Formatter):
+    """Plain log lines with any structured fields appended as key=value"""
+
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with structured fields as top-level keys"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(record.created)),
+            'level': record.levelname,
+            'logger': record.name,
+            'trace_id': getattr(record, 'trace_id', '-'),
+            'message': record.getMessage()
+        }
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+def configure_logging(level='INFO', fmt='text', sample_rate=1.0):
+    """Set up root logging with trace IDs, text or JSON-lines output and DEBUG sampling"""
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if fmt == 'json' else TextFormatter(TEXT_FORMAT))
+    handler.addFilter(TraceIdFilter())
+    handler.addFilter(SamplingFilter(sample_rate))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
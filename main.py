@@ -3,6 +3,10 @@ import numpy as np
 from PIL import Image, ImageDraw, ImageFont
 import tensorflow as tf
 import cv2
+import os
+from ocr_backends import build_backend
+from recognition_thread import RECOGNIZED, FrameTimer, RecognitionWorker
+from board_renderer import BoardRenderer
 
 class SmartWhiteboard:
     def __init__(self, width=1280, height=720):
@@ -26,9 +30,9 @@ class SmartWhiteboard:
         self.all_strokes = []
         self.current_stroke = []
         
-        # Initialize text recognition (using Python-tesseract for handwriting recognition)
-        import pytesseract
-        self.ocr = pytesseract
+        # Initialize text recognition; single strokes default to Tesseract in single-character mode
+        backend = os.environ.get('OCR_BACKEND', 'tesseract')
+        self.ocr = build_backend(backend, {'config': '--psm 10'} if backend == 'tesseract' else None)
         
         # Font for displaying recognized text
         self.font = pygame.font.Font(None, 36)
@@ -36,22 +40,41 @@ class SmartWhiteboard:
         # Store recognized text and their positions
         self.recognized_texts = []
         
-        # Recognition cooldown
-        self.last_recognition_time = 0
-        self.recognition_cooldown = 1.0  # seconds
+        # Recognition runs off the event loop; strokes drawn meanwhile are coalesced
+        self.recognizer = RecognitionWorker(self.recognize_strokes)
+        
+        # Only new ink, new text and repainted regions are pushed to the display
+        self.renderer = BoardRenderer(self.screen, self.font, self.WHITE, self.BLUE)
+        
+        # Frames are capped instead of redrawing as fast as the loop can spin
+        self.fps = int(os.environ.get('WHITEBOARD_FPS', 60))
+        self.clock = pygame.time.Clock()
+        
+        # WHITEBOARD_FRAME_TIMES=1 prints frame-time percentiles and CPU use to check the UI stays smooth
+        self.frame_timer = None
+        if os.environ.get('WHITEBOARD_FRAME_TIMES'):
+            self.frame_timer = FrameTimer(
+                budget_ms=1000 / self.fps if self.fps > 0 else 1000 / 60,
+                details=lambda: f"{self.recognizer.stats()} {self.renderer.stats()}"
+            )
         
     def process_stroke(self, stroke):
         """Convert stroke to image for recognition"""
+        return self.process_strokes([stroke])
+        
+    def process_strokes(self, strokes):
+        """Convert strokes written together to one image for recognition"""
         # Create a blank image
         img = Image.new('L', (200, 200), color='white')
         draw = ImageDraw.Draw(img)
         
         # Normalize stroke points
-        if len(stroke) < 2:
+        strokes = [stroke for stroke in strokes if len(stroke) >= 2]
+        if not strokes:
             return None
             
         # Scale points to fit in image
-        points = np.array(stroke)
+        points = np.array([point for stroke in strokes for point in stroke])
         min_x, min_y = points.min(axis=0)
         max_x, max_y = points.max(axis=0)
         
@@ -59,18 +82,23 @@ class SmartWhiteboard:
         height = max_y - min_y
         scale = min(180 / width, 180 / height) if width > 0 and height > 0 else 1
         
-        normalized_points = []
-        for point in stroke:
-            x = 10 + (point[0] - min_x) * scale
-            y = 10 + (point[1] - min_y) * scale
-            normalized_points.append((x, y))
-        
-        # Draw the stroke
-        if len(normalized_points) > 1:
+        for stroke in strokes:
+            normalized_points = []
+            for point in stroke:
+                x = 10 + (point[0] - min_x) * scale
+                y = 10 + (point[1] - min_y) * scale
+                normalized_points.append((x, y))
+            
+            # Draw the stroke
             draw.line(normalized_points, fill='black', width=3)
         
         return img
         
+    def recognize_strokes(self, strokes):
+        """Render and recognize strokes; runs on the recognition thread"""
+        img = self.process_strokes(strokes)
+        return self.recognize_text(img) if img else None
+        
     def recognize_text(self, image):
         """Recognize text from the processed image"""
         # Convert PIL image to OpenCV format for preprocessing
@@ -81,8 +109,8 @@ class SmartWhiteboard:
         
         # Perform OCR
         try:
-            text = self.ocr.image_to_string(binary, config='--psm 10')
-            text = text.strip()
+            results = self.ocr.recognize_batch([binary])[0]
+            text = ' '.join(result[1] for result in results).strip()
             return text if text else None
         except Exception as e:
             print(f"Recognition error: {e}")
@@ -103,45 +131,40 @@ class SmartWhiteboard:
                 elif event.type == pygame.MOUSEBUTTONUP:
                     self.drawing = False
                     if self.current_stroke:
-                        # Process the completed stroke
-                        img = self.process_stroke(self.current_stroke)
-                        if img:
-                            text = self.recognize_text(img)
-                            if text:
-                                # Get the average position of the stroke
-                                points = np.array(self.current_stroke)
-                                pos = points.mean(axis=0)
-                                self.recognized_texts.append({
-                                    'text': text,
-                                    'position': pos,
-                                    'color': self.BLACK
-                                })
+                        # Hand the completed stroke to the recognition thread
+                        self.recognizer.submit(self.current_stroke)
                         self.current_stroke = []
                         
+                elif event.type == RECOGNIZED:
+                    if event.text:
+                        # Shown at the average position of the recognized strokes
+                        self.recognized_texts.append({
+                            'text': event.text,
+                            'position': event.position,
+                            'color': self.BLACK
+                        })
+                        self.renderer.add_text(event.text, event.position, self.BLACK)
+                        
                 elif event.type == pygame.MOUSEMOTION and self.drawing:
-                    pos = pygame.mouse.get_pos()
-                    self.current_stroke.append(pos)
+                    # Draws just the segment to the new point
+                    self.renderer.extend(self.current_stroke, pygame.mouse.get_pos())
                     
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_c:  # Clear screen
                         self.recognized_texts = []
                         self.current_stroke = []
+                        self.renderer.clear()
                         
-            # Draw background
-            self.screen.fill(self.WHITE)
-            
-            # Draw current stroke
-            if len(self.current_stroke) > 1:
-                pygame.draw.lines(self.screen, self.BLUE, False, self.current_stroke, 2)
-                
-            # Draw recognized text
-            for text_obj in self.recognized_texts:
-                text_surface = self.font.render(text_obj['text'], True, text_obj['color'])
-                text_rect = text_surface.get_rect(center=text_obj['position'])
-                self.screen.blit(text_surface, text_rect)
-                
-            pygame.display.flip()
+            # Strokes still being recognized stay as ink; recognized or dropped ones are erased
+            self.renderer.sync_strokes(self.recognizer.pending_strokes() + [self.current_stroke])
+            self.renderer.present()
+            self.clock.tick(self.fps)
+            if self.frame_timer is not None:
+                self.frame_timer.tick()
             
+        self.recognizer.close()
+        if self.frame_timer is not None:
+            self.frame_timer.report()
         pygame.quit()
 
 if __name__ == "__main__":
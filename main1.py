@@ -1,9 +1,11 @@
 import pygame
 import numpy as np
 from PIL import Image
-import easyocr
 import torch
-import time
+import os
+from ocr_backends import build_backend
+from recognition_thread import RECOGNIZED, FrameTimer, RecognitionWorker
+from board_renderer import BoardRenderer
 
 class SmartWhiteboard:
     def __init__(self, width=800, height=600):
@@ -27,9 +29,9 @@ class SmartWhiteboard:
         self.current_stroke = []
         self.strokes = []  # Store all strokes
         
-        # Initialize EasyOCR
-        print("Initializing EasyOCR (this may take a moment)...")
-        self.reader = easyocr.Reader(['en'])
+        # Initialize the OCR backend (EasyOCR unless OCR_BACKEND says otherwise)
+        print("Initializing OCR backend (this may take a moment)...")
+        self.reader = build_backend(os.environ.get('OCR_BACKEND', 'easyocr'))
         
         # Font for displaying text
         self.font = pygame.font.Font(None, 36)
@@ -37,13 +39,32 @@ class SmartWhiteboard:
         # Store recognized text
         self.recognized_texts = []
         
-        # Recognition cooldown
-        self.last_recognition_time = time.time()
-        self.recognition_cooldown = 1.0  # seconds
+        # Recognition runs off the event loop instead of behind a cooldown that dropped strokes
+        self.recognizer = RecognitionWorker(self.recognize_strokes)
+        
+        # Only new ink, new text and repainted regions are pushed to the display
+        self.renderer = BoardRenderer(self.screen, self.font, self.WHITE, self.BLUE)
+        
+        # Frames are capped instead of redrawing as fast as the loop can spin
+        self.fps = int(os.environ.get('WHITEBOARD_FPS', 60))
+        self.clock = pygame.time.Clock()
+        
+        # WHITEBOARD_FRAME_TIMES=1 prints frame-time percentiles and CPU use to check the UI stays smooth
+        self.frame_timer = None
+        if os.environ.get('WHITEBOARD_FRAME_TIMES'):
+            self.frame_timer = FrameTimer(
+                budget_ms=1000 / self.fps if self.fps > 0 else 1000 / 60,
+                details=lambda: f"{self.recognizer.stats()} {self.renderer.stats()}"
+            )
         
     def stroke_to_image(self, stroke):
         """Convert stroke to PIL Image for recognition"""
-        if len(stroke) < 2:
+        return self.strokes_to_image([stroke])
+        
+    def strokes_to_image(self, strokes):
+        """Convert strokes written together to one PIL Image for recognition"""
+        strokes = [stroke for stroke in strokes if len(stroke) >= 2]
+        if not strokes:
             return None
             
         # Create a white image
@@ -52,7 +73,7 @@ class SmartWhiteboard:
         draw = ImageDraw.Draw(img)
         
         # Scale points to fit in image
-        points = np.array(stroke)
+        points = np.array([point for stroke in strokes for point in stroke])
         min_x, min_y = points.min(axis=0)
         max_x, max_y = points.max(axis=0)
         
@@ -63,23 +84,23 @@ class SmartWhiteboard:
             
         scale = min(180 / width, 180 / height)
         
-        # Normalize points
-        normalized_points = []
-        for point in stroke:
-            x = 10 + (point[0] - min_x) * scale
-            y = 10 + (point[1] - min_y) * scale
-            normalized_points.append((x, y))
-        
-        # Draw the stroke
-        if len(normalized_points) > 1:
+        for stroke in strokes:
+            # Normalize points
+            normalized_points = []
+            for point in stroke:
+                x = 10 + (point[0] - min_x) * scale
+                y = 10 + (point[1] - min_y) * scale
+                normalized_points.append((x, y))
+            
+            # Draw the stroke
             draw.line(normalized_points, fill='black', width=3)
         
         return img
     
     def recognize_text(self, image):
-        """Recognize text from the image using EasyOCR"""
+        """Recognize text from the image using the configured OCR backend"""
         try:
-            results = self.reader.readtext(np.array(image))
+            results = self.reader.recognize_batch([np.array(image)])[0]
             if results:
                 return results[0][1]  # Return the recognized text
             return None
@@ -87,9 +108,13 @@ class SmartWhiteboard:
             print(f"Recognition error: {e}")
             return None
     
+    def recognize_strokes(self, strokes):
+        """Render and recognize strokes; runs on the recognition thread"""
+        img = self.strokes_to_image(strokes)
+        return self.recognize_text(img) if img else None
+    
     def run(self):
         running = True
-        self.screen.fill(self.WHITE)
         
         while running:
             for event in pygame.event.get():
@@ -99,54 +124,44 @@ class SmartWhiteboard:
                 elif event.type == pygame.MOUSEBUTTONDOWN:
                     self.drawing = True
                     self.current_stroke = []
-                    pos = pygame.mouse.get_pos()
-                    self.current_stroke.append(pos)
+                    self.renderer.extend(self.current_stroke, pygame.mouse.get_pos())
                     
                 elif event.type == pygame.MOUSEBUTTONUP:
                     self.drawing = False
                     if self.current_stroke:
-                        # Process the stroke for recognition
-                        img = self.stroke_to_image(self.current_stroke)
-                        if img:
-                            current_time = time.time()
-                            if current_time - self.last_recognition_time > self.recognition_cooldown:
-                                text = self.recognize_text(img)
-                                if text:
-                                    # Calculate average position of stroke
-                                    points = np.array(self.current_stroke)
-                                    pos = points.mean(axis=0)
-                                    self.recognized_texts.append({
-                                        'text': text,
-                                        'position': pos,
-                                        'color': self.BLACK
-                                    })
-                                    # Clear the stroke area
-                                    self.screen.fill(self.WHITE)
-                                    # Redraw all recognized text
-                                    for text_obj in self.recognized_texts:
-                                        text_surface = self.font.render(
-                                            text_obj['text'], True, text_obj['color'])
-                                        text_rect = text_surface.get_rect(
-                                            center=text_obj['position'])
-                                        self.screen.blit(text_surface, text_rect)
-                                self.last_recognition_time = current_time
+                        # Hand the stroke to the recognition thread; strokes written
+                        # while it is busy are recognized together afterwards
+                        self.recognizer.submit(self.current_stroke)
                     self.current_stroke = []
                     
+                elif event.type == RECOGNIZED:
+                    if event.text:
+                        self.recognized_texts.append({
+                            'text': event.text,
+                            'position': event.position,
+                            'color': self.BLACK
+                        })
+                        self.renderer.add_text(event.text, event.position, self.BLACK)
+                    
                 elif event.type == pygame.MOUSEMOTION and self.drawing:
-                    pos = pygame.mouse.get_pos()
-                    self.current_stroke.append(pos)
-                    if len(self.current_stroke) > 1:
-                        pygame.draw.lines(self.screen, self.BLUE, False, 
-                                       self.current_stroke[-2:], 2)
+                    self.renderer.extend(self.current_stroke, pygame.mouse.get_pos())
                 
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_c:  # Clear screen
-                        self.screen.fill(self.WHITE)
                         self.recognized_texts = []
                         self.current_stroke = []
+                        self.renderer.clear()
                     
-            pygame.display.flip()
+            # The recognized strokes are erased once their text is drawn
+            self.renderer.sync_strokes(self.recognizer.pending_strokes() + [self.current_stroke])
+            self.renderer.present()
+            self.clock.tick(self.fps)
+            if self.frame_timer is not None:
+                self.frame_timer.tick()
             
+        self.recognizer.close()
+        if self.frame_timer is not None:
+            self.frame_timer.report()
         pygame.quit()
 
 if __name__ == "__main__":
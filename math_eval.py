@@ -0,0 +1,289 @@
+import logging
+import multiprocessing
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# OCR confusions and symbols SymPy spells differently
+REPLACEMENTS = {'×': '*', '÷': '/', '√': 'sqrt', 'π': 'pi', '∞': 'oo'}
+
+# Function and constant names an expression may use; other words are OCR'd prose
+KNOWN_NAMES = frozenset((
+    'sqrt', 'sin', 'cos', 'tan', 'cot', 'sec', 'csc', 'asin', 'acos', 'atan',
+    'sinh', 'cosh', 'tanh', 'log', 'ln', 'exp', 'abs', 'pi', 'oo', 'E', 'I'
+))
+
+TOKEN = re.compile(r"""
+    (?P<number>\d+(?:\.\d*)?|\.\d+)
+  | (?P<name>[A-Za-z]+|[α-ωΑ-Ω])
+  | (?P<command>\\[A-Za-z]+)
+  | (?P<operator>\*\*|[-+*/^=!%,])
+  | (?P<open>[(\[{])
+  | (?P<close>[)\]}])
+  | (?P<space>\s+)
+""", re.VERBOSE)
+
+BRACKETS = {')': '(', ']': '[', '}': '{'}
+
+# Numbers longer than this are misread strokes, not something worth evaluating
+MAX_NUMBER_DIGITS = 64
+
+def normalize_expression(text):
+    """Expression text SymPy can parse, and whether it should be read as LaTeX"""
+    for old, new in REPLACEMENTS.items():
+        text = text.replace(old, new)
+    latex = '\\' in text or '{' in text
+    if not latex:
+        text = re.sub(r'\s+', '', text)
+    return text, latex
+
+def precheck(text, latex=False):
+    """Cheap tokenizer and grammar check; None if text may be math, else why it is not"""
+    position = 0
+    operands = 0
+    stack = []
+    previous = 'open'
+    while position < len(text):
+        match = TOKEN.match(text, position)
+        if match is None:
+            return f"unexpected character {text[position]!r}"
+        position = match.end()
+        kind, value = match.lastgroup, match.group()
+        if kind == 'space':
+            continue
+        if kind == 'number':
+            if len(value) > MAX_NUMBER_DIGITS:
+                return 'number too long'
+            operands += 1
+        elif kind == 'name':
+            if len(value) > 1 and value not in KNOWN_NAMES:
+                return f"unknown name {value!r}"
+            operands += 1
+        elif kind == 'command' and not latex:
+            return 'LaTeX command outside LaTeX'
+        elif kind == 'operator':
+            # Only a sign may follow another operator or an opening bracket
+            if previous in ('operator', 'open') and value not in '+-':
+                return f"misplaced operator {value!r}"
+        elif kind == 'open':
+            stack.append(value)
+        elif kind == 'close':
+            if not stack or stack.pop() != BRACKETS[value]:
+                return 'unbalanced brackets'
+        previous = kind
+    if stack:
+        return 'unbalanced brackets'
+    if not operands:
+        return 'no numbers or variables'
+    if previous == 'operator' and text.rstrip()[-1] != '!':
+        return 'ends with an operator'
+    return None
+
+def _evaluate(sympy, parse_latex, text, latex):
+    expr = parse_latex(text) if latex else sympy.sympify(text)
+    return str(expr), str(expr.evalf())
+
+def _limit_memory(memory_mb):
+    """Let this process grow by at most memory_mb of address space, where the OS supports it"""
+    try:
+        import resource
+        with open('/proc/self/statm') as statm:
+            current = int(statm.read().split()[0]) * resource.getpagesize()
+        limit = current + int(memory_mb * 1024 * 1024)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, OSError, ValueError) as e:
+        logger.warning(f"Cannot limit math worker memory: {str(e)}")
+
+def _worker_main(conn, memory_mb):
+    """Entry point of an evaluation process: import SymPy, cap further memory, then evaluate"""
+    import sympy
+    # Imported up front so its slow first import is not charged to an expression's budget;
+    # parsing still fails per call without the optional antlr4 runtime
+    from sympy.parsing.latex import parse_latex
+    if memory_mb:
+        _limit_memory(memory_mb)
+
+    conn.send(('ready', None))
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        text, latex = message
+        try:
+            conn.send(('result', _evaluate(sympy, parse_latex, text, latex)))
+        except Exception as e:
+            conn.send(('error', str(e)))
+
+class _Worker:
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.conn = None
+
+class MathEvaluator:
+    """Evaluate recognized math in worker processes with a time budget and a result cache
+
+    Text that fails the tokenizer pre-check never reaches SymPy. An evaluation that
+    runs past timeout has its worker killed and replaced in the background.
+    """
+
+    def __init__(self, num_workers=2, timeout=2.0, cache_size=1024, memory_mb=512, wait_timeout=30.0):
+        self.num_workers = max(1, int(num_workers))
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.memory_mb = memory_mb
+        # How long a request waits for a free (or restarting) worker
+        self.wait_timeout = wait_timeout
+
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = [_Worker(i) for i in range(self.num_workers)]
+        self._idle = queue.Queue()
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._started = False
+        self._closed = False
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.errors = 0
+        self.restarts = 0
+
+    def start(self):
+        """Spawn the workers in the background; they join the pool once SymPy is imported"""
+        with self._lock:
+            if self._started:
+                return self
+            self._started = True
+        for worker in self._workers:
+            threading.Thread(target=self._respawn, args=(worker,), daemon=True).start()
+        return self
+
+    def evaluate(self, text):
+        """(expression, numeric value) of recognized math text; the value is None if it has none"""
+        normalized, latex = normalize_expression(text)
+        reason = precheck(normalized, latex)
+        if reason is not None:
+            logger.debug("Not evaluating %r: %s", normalized, reason)
+            with self._lock:
+                self.rejected += 1
+            return normalized, None
+
+        with self._lock:
+            if normalized in self._cache:
+                self._cache.move_to_end(normalized)
+                self.hits += 1
+                return self._cache[normalized]
+            self.misses += 1
+
+        result = self._run(normalized, latex)
+        if result is None:
+            # Busy or crashed workers are not a property of the expression; do not cache
+            return normalized, None
+
+        with self._lock:
+            self._cache[normalized] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+    def stats(self):
+        """Snapshot of cache and evaluation counters"""
+        with self._lock:
+            return {
+                'workers': self.num_workers,
+                'idle': self._idle.qsize(),
+                'cached': len(self._cache),
+                'hits': self.hits,
+                'misses': self.misses,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts,
+                'errors': self.errors,
+                'restarts': self.restarts
+            }
+
+    def close(self):
+        """Stop the workers"""
+        self._closed = True
+        for worker in self._workers:
+            if worker.conn is not None:
+                try:
+                    worker.conn.send(None)
+                except (OSError, ValueError):
+                    pass
+            if worker.process is not None:
+                worker.process.join(1)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+
+    def _run(self, text, latex):
+        """Evaluate on a free worker; None if no worker was available or it died"""
+        self.start()
+        try:
+            worker = self._idle.get(timeout=self.wait_timeout)
+        except queue.Empty:
+            logger.warning("No math worker available")
+            return None
+
+        try:
+            worker.conn.send((text, latex))
+            if not worker.conn.poll(self.timeout):
+                logger.warning(f"Math evaluation of {text!r} exceeded {self.timeout}s")
+                with self._lock:
+                    self.timeouts += 1
+                self._restart(worker)
+                return text, None
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError) as e:
+            logger.error(f"Math worker {worker.index} died: {str(e)}")
+            self._restart(worker)
+            return None
+
+        self._idle.put(worker)
+        if status == 'result':
+            return payload
+        logger.warning(f"Math parsing error: {payload}")
+        with self._lock:
+            self.errors += 1
+        return text, None
+
+    def _restart(self, worker):
+        worker.process.kill()
+        worker.process.join(1)
+        worker.conn.close()
+        with self._lock:
+            self.restarts += 1
+        threading.Thread(target=self._respawn, args=(worker,), daemon=True).start()
+
+    def _respawn(self, worker):
+        """Start a worker process and hand it to the pool once it is ready"""
+        while not self._closed:
+            parent_conn, child_conn = self._context.Pipe()
+            process = self._context.Process(
+                target=_worker_main,
+                args=(child_conn, self.memory_mb),
+                name=f"math-worker-{worker.index}",
+                daemon=True
+            )
+            process.start()
+            child_conn.close()
+            try:
+                parent_conn.recv()
+            except EOFError:
+                process.join(1)
+                if self._closed:
+                    return
+                logger.error(f"Math worker {worker.index} failed to start (exit code {process.exitcode})")
+                time.sleep(1)
+                continue
+            worker.process = process
+            worker.conn = parent_conn
+            self._idle.put(worker)
+            return
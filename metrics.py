@@ -0,0 +1,148 @@
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+import uuid
+from contextlib import nullcontext
+
+from flask import Response, g, jsonify, request
+
+# Histogram bucket upper bounds in seconds, from sub-millisecond stages to slow OCR calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Trace ID of the request being handled, '-' outside requests
+trace_id = contextvars.ContextVar('trace_id', default='-')
+
+# Shared no-op returned by timer() when metrics are disabled
+_NO_TIMER = nullcontext()
+
+class TraceIdFilter(logging.Filter):
+    """Add the current request's trace ID to every log record as %(trace_id)s"""
+
+    def filter(self, record):
+        record.trace_id = trace_id.get()
+        return True
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+class _StageTimer:
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, time.perf_counter() - self.start)
+        return False
+
+class Metrics:
+    """Per-stage latency histograms and request counters exported in Prometheus text format"""
+
+    def __init__(self, enabled=True, buckets=DEFAULT_BUCKETS, namespace='whiteboard'):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self.namespace = namespace
+
+        self._lock = threading.Lock()
+        self._stages = {}
+        self._requests = {}
+
+    def timer(self, stage):
+        """Context manager that records the time spent in its block under stage"""
+        if not self.enabled:
+            return _NO_TIMER
+        return _StageTimer(self, stage)
+
+    def timed(self, stage):
+        """Decorator form of timer(); the check happens per call so metrics can be toggled"""
+        def decorate(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timer(stage):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def observe(self, stage, seconds):
+        """Record one duration for stage"""
+        if not self.enabled:
+            return
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            histogram = self._stages.get(stage)
+            if histogram is None:
+                histogram = self._stages[stage] = _Histogram(self.buckets)
+            histogram.counts[index] += 1
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def count_request(self, endpoint, status):
+        """Count one finished request by endpoint and status code"""
+        if not self.enabled:
+            return
+        key = (endpoint, status)
+        with self._lock:
+            self._requests[key] = self._requests.get(key, 0) + 1
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        name = f"{self.namespace}_stage_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each recognition pipeline stage.",
+            f"# TYPE {name} histogram"
+        ]
+        with self._lock:
+            for stage, histogram in sorted(self._stages.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), histogram.counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {histogram.sum!r}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {histogram.count}')
+
+            name = f"{self.namespace}_requests_total"
+            lines.append(f"# HELP {name} Finished HTTP requests.")
+            lines.append(f"# TYPE {name} counter")
+            for (endpoint, status), count in sorted(self._requests.items()):
+                lines.append(f'{name}{{endpoint="{endpoint}",status="{status}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+def install(app, metrics):
+    """Give every request a trace ID, time it, and serve the metrics on /metrics"""
+
+    @app.before_request
+    def start_request():
+        # Reuse the caller's ID so logs can be joined across services
+        trace_id.set(request.headers.get('X-Request-ID') or uuid.uuid4().hex[:16])
+        g.request_start = time.perf_counter()
+
+    @app.after_request
+    def finish_request(response):
+        if 'request_start' in g:
+            endpoint = request.endpoint or 'unknown'
+            metrics.observe(f"request:{endpoint}", time.perf_counter() - g.request_start)
+            metrics.count_request(endpoint, response.status_code)
+        response.headers['X-Request-ID'] = trace_id.get()
+        return response
+
+    @app.teardown_request
+    def clear_trace_id(exc):
+        trace_id.set('-')
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        if not metrics.enabled:
+            return jsonify({'error': 'Metrics are disabled'}), 404
+        return Response(metrics.render(), content_type=PROMETHEUS_CONTENT_TYPE)
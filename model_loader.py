@@ -0,0 +1,81 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class ModelNotReady(RuntimeError):
+    """Raised when a model is requested before it finished loading"""
+
+class LazyModel:
+    """Load a model on a background thread so the process can serve health checks meanwhile"""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self.factory = factory
+
+        self._lock = threading.Lock()
+        self._loaded = threading.Event()
+        self._thread = None
+        self._model = None
+        self.error = None
+        self.started = None
+        self.load_seconds = None
+
+    @property
+    def ready(self):
+        return self._loaded.is_set() and self.error is None
+
+    def start(self):
+        """Begin loading in the background; calling it again is a no-op"""
+        with self._lock:
+            if self._thread is None:
+                self.started = time.time()
+                self._thread = threading.Thread(target=self._load, name=f"load-{self.name}", daemon=True)
+                self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        """Start loading if needed and wait until it finishes; True if the model is usable"""
+        self.start()
+        self._loaded.wait(timeout)
+        return self.ready
+
+    def get(self, timeout=None):
+        """Return the loaded model, waiting for it up to timeout"""
+        if not self.wait(timeout):
+            if self.error is not None:
+                raise ModelNotReady(f"{self.name} failed to load: {self.error}")
+            raise ModelNotReady(f"{self.name} is still loading")
+        return self._model
+
+    def status(self):
+        """Loading state for readiness checks"""
+        if self.ready:
+            state = 'ready'
+        elif self.error is not None:
+            state = 'failed'
+        elif self._thread is not None:
+            state = 'loading'
+        else:
+            state = 'idle'
+        return {
+            'model': self.name,
+            'state': state,
+            'load_seconds': self.load_seconds,
+            'error': self.error
+        }
+
+    def _load(self):
+        logger.info(f"Loading {self.name}")
+        start = time.perf_counter()
+        try:
+            self._model = self.factory()
+        except Exception as e:
+            logger.error(f"Error loading {self.name}: {str(e)}")
+            self.error = str(e)
+        else:
+            self.load_seconds = time.perf_counter() - start
+            logger.info(f"{self.name} loaded in {self.load_seconds:.2f}s")
+        finally:
+            self._loaded.set()
@@ -0,0 +1,451 @@
+import logging
+import os
+import threading
+import time
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Options of reader.readtext that EasyOCR's detection-free reader.recognize also understands
+RECOGNIZE_OPTIONS = ('decoder', 'beamWidth', 'workers', 'allowlist', 'blocklist', 'contrast_ths', 'adjust_contrast')
+
+# 'adaptive' decodes greedily and re-decodes only low-confidence regions with beam search
+DECODINGS = ('greedy', 'beamsearch', 'adaptive')
+
+# 'int8' runs dynamically quantized detector and recognizer modules on the CPU, which is
+# what EasyOCR's own quantize=True default does; 'float' turns that off
+PRECISIONS = ('float', 'int8')
+
+# White rows between crops stacked into one image, so no two crops share a top edge
+CROP_GAP = 2
+
+def full_box(image):
+    """Corner points of the whole image, the box reported by engines without detection"""
+    height, width = image.shape[:2]
+    return [[0, 0], [width, 0], [width, height], [0, height]]
+
+def stack_crops(jobs, gap=CROP_GAP):
+    """Copy the box crops of several (image, boxes) jobs top to bottom into one white image
+
+    Returns the stacked image and every crop's [x_min, x_max, y_min, y_max] box in it,
+    in job order, or (None, []) when there are no boxes.
+    """
+    crops = [image[y0:y1, x0:x1] for image, boxes in jobs for x0, x1, y0, y1 in boxes]
+    if not crops:
+        return None, []
+    width = max(crop.shape[1] for crop in crops)
+    height = sum(crop.shape[0] + gap for crop in crops)
+    stacked = np.full((height, width) + crops[0].shape[2:], 255, dtype=crops[0].dtype)
+    boxes = []
+    y = 0
+    for crop in crops:
+        crop_height, crop_width = crop.shape[:2]
+        stacked[y:y + crop_height, :crop_width] = crop
+        boxes.append([0, crop_width, y, y + crop_height])
+        y += crop_height + gap
+    return stacked, boxes
+
+class OCRBackend:
+    """Recognizer interface shared by the servers and the desktop whiteboard
+
+    recognize_batch(images) returns, for every image, a list of (box, text, confidence)
+    results in the shape EasyOCR's readtext uses; confidence may be None.
+    """
+
+    name = 'base'
+
+    def load(self):
+        """Load the model; returns the backend so calls can be chained"""
+        return self
+
+    def warmup(self):
+        """Run one blank image through the model so the first request does not pay for lazy setup"""
+        start = time.perf_counter()
+        self.recognize_batch([np.full((64, 64), 255, dtype=np.uint8)])
+        logger.info(f"{self.name} backend warmed up in {time.perf_counter() - start:.2f}s")
+        return self
+
+    def recognize_batch(self, images):
+        raise NotImplementedError
+
+    def recognize_boxes(self, image, boxes):
+        """(text, confidence) of each [x_min, x_max, y_min, y_max] box of one image, skipping detection"""
+        crops = [image[y0:y1, x0:x1] for x0, x1, y0, y1 in boxes]
+        return [
+            (' '.join(result[1] for result in results), lowest_confidence(results))
+            for results in self.recognize_batch(crops)
+        ]
+
+    def recognize_box_batch(self, jobs):
+        """(text, confidence) lists for several (image, boxes) jobs from one recognize_boxes call
+
+        The crops of every job are stacked into one image, so an engine that reads all
+        boxes of an image in one pass reads the whole batch in one pass.
+        """
+        image, boxes = stack_crops(jobs)
+        decoded = iter(self.recognize_boxes(image, boxes) if boxes else [])
+        return [[next(decoded) for _ in job_boxes] for _, job_boxes in jobs]
+
+    def stats(self):
+        """Backend counters for the stats endpoints"""
+        return {'backend': self.name}
+
+    def close(self):
+        """Release the model"""
+
+def lowest_confidence(results):
+    """Smallest confidence among results, or None if the engine reported none"""
+    confidences = [result[2] for result in results if len(result) > 2 and result[2] is not None]
+    return min(confidences) if confidences else None
+
+class EasyOCRBackend(OCRBackend):
+    """EasyOCR detection plus greedy, beam-search or adaptive recognition"""
+
+    name = 'easyocr'
+
+    def __init__(self, languages=('en',), reader_options=None, readtext_options=None,
+                 decoding=None, confidence_threshold=0.5, beam_width=10,
+                 precision=None, threads=None):
+        # decoding overrides readtext_options' decoder; None keeps it as given
+        if decoding is not None and decoding not in DECODINGS:
+            raise ValueError(f"Unknown decoding: {decoding}")
+        # precision None leaves quantization to EasyOCR's own quantize option
+        if precision is not None and precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {precision}")
+        self.languages = list(languages)
+        self.reader_options = reader_options or {}
+        self.readtext_options = dict(readtext_options or {})
+        self.decoding = decoding or self.readtext_options.get('decoder', 'greedy')
+        self.confidence_threshold = confidence_threshold
+        self.beam_width = beam_width
+        if self.decoding != 'adaptive':
+            self.readtext_options['decoder'] = self.decoding
+        self.precision = precision
+        self.threads = threads
+        self.reader = None
+
+        self._lock = threading.Lock()
+        self.regions = 0
+        self.escalated = 0
+
+    def load(self):
+        # Imported here so the process starts (and answers /healthz) before torch loads
+        import easyocr
+        if self.threads:
+            import torch
+            torch.set_num_threads(self.threads)
+        options = dict(self.reader_options)
+        if self.precision is not None:
+            # precision only names EasyOCR's quantize option, which applies torch's dynamic
+            # int8 quantization to both models as they load on the CPU. EasyOCR 1.7 keeps
+            # quantizing the detector with quantize=False, so 'float' keeps the recognizer
+            # in float only
+            options['quantize'] = self.precision == 'int8'
+        self.reader = easyocr.Reader(self.languages, **options)
+        if self.precision == 'int8' and self.reader.device != 'cpu':
+            logger.warning(f"int8 precision runs on the CPU only; keeping float models on {self.reader.device}")
+        return self
+
+    def recognize_batch(self, images):
+        """Run one batched readtext call per group of equally sized images"""
+        if self.decoding != 'adaptive':
+            return self._readtext(images, self.readtext_options)
+
+        # Paragraph merging drops confidences, so decode regions first and merge afterwards
+        options = dict(self.readtext_options, decoder='greedy', paragraph=False)
+        batch = self._readtext(images, options)
+        for image, results in zip(images, batch):
+            boxes = [
+                [int(min(x for x, _ in box)), int(max(x for x, _ in box)) + 1,
+                 int(min(y for _, y in box)), int(max(y for _, y in box)) + 1]
+                for box, *_ in results
+            ]
+            decoded = self._escalate(image, boxes, [(text, float(confidence)) for _, text, confidence in results])
+            results[:] = [(box, text, confidence) for (box, *_), (text, confidence) in zip(results, decoded)]
+
+        if self.readtext_options.get('paragraph'):
+            batch = [self._paragraphs(results) for results in batch]
+        return batch
+
+    def recognize_boxes(self, image, boxes):
+        """Recognize every box in one recognizer pass without running the CRAFT detector"""
+        if not boxes:
+            return []
+        if self.decoding != 'adaptive':
+            return self._recognize(image, boxes, {})
+        return self._escalate(image, boxes, self._recognize(image, boxes, {'decoder': 'greedy'}))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.name,
+                'decoding': self.decoding,
+                'precision': self.precision or 'default',
+                'threads': self.threads,
+                'confidence_threshold': self.confidence_threshold,
+                'beam_width': self.beam_width,
+                'regions': self.regions,
+                'escalated': self.escalated,
+                'escalation_rate': self.escalated / self.regions if self.regions else 0.0
+            }
+
+    def close(self):
+        self.reader = None
+
+    def _readtext(self, images, options):
+        groups = {}
+        for i, image in enumerate(images):
+            groups.setdefault(image.shape, []).append(i)
+
+        results = [None] * len(images)
+        for indices in groups.values():
+            batch = self.reader.readtext_batched(
+                [images[i] for i in indices],
+                batch_size=len(indices),
+                **options
+            )
+            for i, result in zip(indices, batch):
+                results[i] = result
+        return results
+
+    def _recognize(self, image, boxes, overrides):
+        """(text, confidence) per [x_min, x_max, y_min, y_max] box from reader.recognize"""
+        options = {key: value for key, value in self.readtext_options.items() if key in RECOGNIZE_OPTIONS}
+        options.update(overrides)
+        results = self.reader.recognize(
+            image,
+            horizontal_list=boxes,
+            free_list=[],
+            batch_size=len(boxes),
+            detail=1,
+            paragraph=False,
+            **options
+        )
+
+        # The recognizer returns boxes sorted by position; map them back by their top-left corner
+        found = {}
+        for box, text, confidence in results:
+            found.setdefault((int(box[0][0]), int(box[0][1])), []).append((text, float(confidence)))
+        return [
+            found[(box[0], box[2])].pop(0) if found.get((box[0], box[2])) else ('', 0.0)
+            for box in boxes
+        ]
+
+    def _escalate(self, image, boxes, decoded):
+        """Re-decode the boxes whose greedy confidence is below the threshold with beam search"""
+        low = [i for i, (_, confidence) in enumerate(decoded) if confidence < self.confidence_threshold]
+        with self._lock:
+            self.regions += len(decoded)
+            self.escalated += len(low)
+        if not low:
+            return decoded
+
+        redecoded = self._recognize(
+            image,
+            [boxes[i] for i in low],
+            {'decoder': 'beamsearch', 'beamWidth': self.beam_width}
+        )
+        decoded = list(decoded)
+        for i, result in zip(low, redecoded):
+            decoded[i] = result
+        return decoded
+
+    def _paragraphs(self, results):
+        """Merge region results into paragraphs like readtext(paragraph=True), keeping the lowest confidence"""
+        from easyocr.utils import get_paragraph
+        merged = []
+        for box, text in get_paragraph(
+            results,
+            x_ths=self.readtext_options.get('x_ths', 1.0),
+            y_ths=self.readtext_options.get('y_ths', 0.5)
+        ):
+            (x0, y0), (x1, y1) = box[0], box[2]
+            inside = [
+                confidence for region, _, confidence in results
+                if x0 <= sum(x for x, _ in region) / len(region) <= x1
+                and y0 <= sum(y for _, y in region) / len(region) <= y1
+            ]
+            merged.append((box, text, min(inside) if inside else None))
+        return merged
+
+class TesseractBackend(OCRBackend):
+    """Tesseract through pytesseract; cheap on CPU and good enough for single characters"""
+
+    name = 'tesseract'
+
+    def __init__(self, lang='eng', config='--psm 7'):
+        self.lang = lang
+        self.config = config
+        self.tesseract = None
+
+    def load(self):
+        import pytesseract
+        self.tesseract = pytesseract
+        return self
+
+    def recognize_batch(self, images):
+        results = []
+        for image in images:
+            text = self.tesseract.image_to_string(image, lang=self.lang, config=self.config).strip()
+            results.append([(full_box(image), text, None)] if text else [])
+        return results
+
+class OnnxBackend(OCRBackend):
+    """CTC line recognizer exported to ONNX and run on ONNX Runtime's CPU provider"""
+
+    name = 'onnx'
+
+    def __init__(self, model_path, charset, input_height=64, threads=None, providers=('CPUExecutionProvider',)):
+        # charset is the model's output alphabet, either as a string or a file holding it;
+        # output class 0 is the CTC blank, class i the charset's (i-1)th character
+        self.model_path = model_path
+        self.charset = charset
+        self.input_height = input_height
+        self.threads = threads
+        self.providers = list(providers)
+        self.session = None
+
+    def load(self):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        self.session = onnxruntime.InferenceSession(self.model_path, options, providers=self.providers)
+        if isinstance(self.charset, str) and self.charset.endswith('.txt'):
+            with open(self.charset, encoding='utf-8') as f:
+                self.charset = f.read().rstrip('\n')
+        return self
+
+    def recognize_batch(self, images):
+        if not images:
+            return []
+        batch = self._prepare(images)
+        feeds = {self.session.get_inputs()[0].name: batch}
+        # EasyOCR's recognizer takes an unused text tensor as a second input
+        for extra in self.session.get_inputs()[1:]:
+            feeds[extra.name] = np.zeros((len(images), 1), dtype=np.int64)
+        logits = self.session.run(None, feeds)[0]
+        return [
+            [(full_box(image), text, confidence)] if text else []
+            for image, (text, confidence) in zip(images, self._decode(logits))
+        ]
+
+    def close(self):
+        self.session = None
+
+    def _prepare(self, images):
+        """Resize to the model height, pad to a common width and normalize to [-1, 1]"""
+        resized = []
+        for image in images:
+            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+            height, width = gray.shape
+            new_width = max(1, int(round(width * self.input_height / max(height, 1))))
+            resized.append(cv2.resize(gray, (new_width, self.input_height), interpolation=cv2.INTER_AREA))
+
+        batch = np.full((len(resized), 1, self.input_height, max(r.shape[1] for r in resized)), 255, dtype=np.uint8)
+        for i, image in enumerate(resized):
+            batch[i, 0, :, :image.shape[1]] = image
+        return (batch.astype(np.float32) / 255.0 - 0.5) / 0.5
+
+    def _decode(self, logits):
+        """Greedy CTC decoding: best class per step, repeats collapsed, blanks dropped"""
+        shifted = np.exp(logits - logits.max(axis=2, keepdims=True))
+        probs = shifted / shifted.sum(axis=2, keepdims=True)
+        best = probs.argmax(axis=2)
+        decoded = []
+        for row, row_probs in zip(best, probs):
+            keep = (row != 0) & np.concatenate([[True], row[1:] != row[:-1]])
+            text = ''.join(self.charset[c - 1] for c in row[keep] if c - 1 < len(self.charset))
+            confidence = float(row_probs.max(axis=1)[keep].mean()) if keep.any() else 0.0
+            decoded.append((text, confidence))
+        return decoded
+
+class RoutingBackend(OCRBackend):
+    """Send single-character word boxes to a cheap engine and everything else to the accurate one
+
+    Whole images go to the primary engine: a board or a detector crop may hold several
+    lines even when it is nearly square. Only word boxes, which segmentation cuts from
+    one line of ink, are routed by shape.
+    """
+
+    name = 'routing'
+
+    def __init__(self, primary, fast, max_aspect=1.5):
+        # Word boxes no wider than max_aspect times their height hold about one character
+        self.primary = primary
+        self.fast = fast
+        self.max_aspect = max_aspect
+        self.routed = 0
+        self.total = 0
+
+    def load(self):
+        self.primary.load()
+        self.fast.load()
+        return self
+
+    def recognize_batch(self, images):
+        self.total += len(images)
+        return self.primary.recognize_batch(images)
+
+    def recognize_boxes(self, image, boxes):
+        short = [i for i, (x0, x1, y0, y1) in enumerate(boxes) if self._is_short(x1 - x0, y1 - y0)]
+        return self._merge(
+            len(boxes),
+            short,
+            lambda indices: self.fast.recognize_boxes(image, [boxes[i] for i in indices]),
+            lambda indices: self.primary.recognize_boxes(image, [boxes[i] for i in indices])
+        )
+
+    def stats(self):
+        return {
+            'backend': self.name,
+            'routed': self.routed,
+            'total': self.total,
+            'primary': self.primary.stats(),
+            'fast': self.fast.stats()
+        }
+
+    def close(self):
+        self.primary.close()
+        self.fast.close()
+
+    def _is_short(self, width, height):
+        return width <= self.max_aspect * max(height, 1)
+
+    def _merge(self, count, short, run_fast, run_primary):
+        short_set = set(short)
+        rest = [i for i in range(count) if i not in short_set]
+        self.routed += len(short)
+        self.total += count
+
+        results = [None] * count
+        for indices, run in ((short, run_fast), (rest, run_primary)):
+            if indices:
+                for i, result in zip(indices, run(indices)):
+                    results[i] = result
+        return results
+
+# Backends selectable by name in configuration
+BACKENDS = {
+    'easyocr': EasyOCRBackend,
+    'tesseract': TesseractBackend,
+    'onnx': OnnxBackend
+}
+
+def create_backend(name, **options):
+    """Instantiate a backend by its configured name"""
+    try:
+        backend_class = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown OCR backend: {name}")
+    return backend_class(**options)
+
+def build_backend(name, options=None, fast_name=None, fast_options=None, warmup=True):
+    """Create, load and warm up a backend, optionally routing single characters to fast_name"""
+    backend = create_backend(name, **(options or {}))
+    if fast_name:
+        backend = RoutingBackend(backend, create_backend(fast_name, **(fast_options or {})))
+    backend.load()
+    return backend.warmup() if warmup else backend
@@ -0,0 +1,168 @@
+import logging
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+logger = logging.getLogger(__name__)
+
+# Sentinel pushed onto the queue to stop the dispatcher thread
+_STOP = object()
+
+def depth_bucket(depth):
+    """Round a queue depth up to a power-of-two histogram bucket"""
+    bucket = 1
+    while bucket < depth:
+        bucket *= 2
+    return bucket if depth else 0
+
+class BatchScheduler:
+    """Queue recognition requests and run them through the model in micro-batches
+
+    Besides whole images, the scheduler takes word-box jobs (an image plus the boxes to
+    read in it). Both kinds share the batching window and the dispatcher thread, so every
+    model call is serialized and counted here. The images of a batch go through one
+    recognize_batch call and the box jobs through one recognize_boxes call; batch sizes
+    count images and word-box crops respectively.
+    """
+
+    def __init__(self, recognize_batch, max_batch_size=8, max_wait_ms=10, name='ocr', recognize_boxes=None):
+        # recognize_batch takes a list of images and returns one result per image;
+        # recognize_boxes takes a list of (image, boxes) jobs, reads all their boxes in
+        # one model call and returns one list of (text, confidence) per job
+        self.recognize_batch = recognize_batch
+        self.recognize_boxes = recognize_boxes
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batch_sizes = Counter()
+        self.queue_depths = Counter()
+        self.submitted = 0
+        self.box_jobs = 0
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+
+        self._thread = threading.Thread(target=self._run, name=f"{name}-scheduler", daemon=True)
+        self._thread.start()
+
+    def submit(self, image):
+        """Queue an image for recognition and return a Future for its result"""
+        future = Future()
+        with self._lock:
+            self.submitted += 1
+        self._queue.put((image, None, future))
+        return future
+
+    def submit_boxes(self, image, boxes):
+        """Queue a word-box job and return a Future for its (text, confidence) list"""
+        if self.recognize_boxes is None:
+            raise RuntimeError(f"{self.name} scheduler has no box recognizer")
+        future = Future()
+        with self._lock:
+            self.submitted += 1
+            self.box_jobs += 1
+        self._queue.put((image, boxes, future))
+        return future
+
+    def recognize(self, image, timeout=None):
+        """Queue an image and block until its batch has been recognized"""
+        return self.submit(image).result(timeout)
+
+    def queue_depth(self):
+        """Number of requests waiting for a batch slot"""
+        return self._queue.qsize()
+
+    def stats(self):
+        """Snapshot of queue and batching counters"""
+        with self._lock:
+            return {
+                'queue_depth': self.queue_depth(),
+                'submitted': self.submitted,
+                'box_jobs': self.box_jobs,
+                'completed': self.completed,
+                'failed': self.failed,
+                'batches': self.batches,
+                'max_batch_size': self.max_batch_size,
+                'max_wait_ms': self.max_wait * 1000.0,
+                'batch_size_histogram': dict(sorted(self.batch_sizes.items())),
+                'queue_depth_histogram': dict(sorted(self.queue_depths.items()))
+            }
+
+    def close(self, timeout=None):
+        """Stop the dispatcher once the already queued requests have been served"""
+        self._queue.put(_STOP)
+        self._thread.join(timeout)
+
+    def _collect(self):
+        """Block for one request, then gather more until the batch is full or the window closes"""
+        item = self._queue.get()
+        if item is _STOP:
+            return None, True
+
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    def _dispatch(self, batch):
+        """Run one batched recognition call and fan results back to the waiting futures"""
+        # Drop requests whose callers already gave up
+        batch = [item for item in batch if item[2].set_running_or_notify_cancel()]
+        if not batch:
+            return
+
+        with self._lock:
+            self.queue_depths[depth_bucket(self._queue.qsize())] += 1
+
+        images = [(image, future) for image, boxes, future in batch if boxes is None]
+        jobs = [((image, boxes), future) for image, boxes, future in batch if boxes is not None]
+        if images:
+            self._dispatch_group(self.recognize_batch, images, len(images))
+        if jobs:
+            self._dispatch_group(self.recognize_boxes, jobs, sum(len(boxes) for (_, boxes), _ in jobs))
+
+    def _dispatch_group(self, recognize, items, size):
+        """Run one recognition call over the items' inputs and resolve their futures
+
+        size is what the call reads, images or word-box crops, for the batch histogram.
+        """
+        with self._lock:
+            self.batches += 1
+            self.batch_sizes[size] += 1
+        try:
+            results = recognize([item for item, _ in items])
+            if len(results) != len(items):
+                raise RuntimeError(f"Expected {len(items)} results, got {len(results)}")
+        except Exception as e:
+            logger.error(f"Error in batched recognition: {str(e)}")
+            for _, future in items:
+                future.set_exception(e)
+            with self._lock:
+                self.failed += len(items)
+            return
+
+        for (_, future), result in zip(items, results):
+            future.set_result(result)
+        with self._lock:
+            self.completed += len(items)
+
+    def _run(self):
+        """Dispatcher loop"""
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if batch:
+                self._dispatch(batch)
@@ -0,0 +1,212 @@
+import logging
+import threading
+import time
+
+import cv2
+import numpy as np
+from PIL import Image, ImageEnhance, ImageFilter
+
+logger = logging.getLogger(__name__)
+
+# Stages in the order they run
+STAGES = ('enhance', 'deskew', 'denoise', 'clahe', 'threshold', 'morphology')
+MODES = ('on', 'off', 'auto')
+
+# 'auto' skips work that only helps with camera or scanner input on rasters we render ourselves
+DEFAULT_MODES = {
+    'enhance': 'auto',
+    'deskew': 'auto',
+    'denoise': 'auto',
+    'clahe': 'auto',
+    'threshold': 'on',
+    'morphology': 'on'
+}
+
+# Stages auto-skipped when the image was synthesized from clean vector strokes
+SYNTHETIC_SKIPS = ('enhance', 'denoise', 'clahe')
+
+def to_gray(img_array):
+    """Convert an RGB array to grayscale, leaving grayscale arrays untouched"""
+    if len(img_array.shape) == 3:
+        return cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+    return img_array
+
+def detect_text_angle(image_array):
+    """Detect text angle for rotation correction"""
+    try:
+        gray = to_gray(image_array)
+
+        # Detect edges
+        edges = cv2.Canny(gray, 50, 150, apertureSize=3)
+
+        # Use Hough Transform to detect lines
+        lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=100)
+
+        if lines is not None:
+            angles = []
+            for rho, theta in lines[:, 0]:
+                angle = np.degrees(theta)
+                if angle < 45:
+                    angles.append(angle)
+                elif angle > 135:
+                    angles.append(angle - 180)
+
+            if angles:
+                median_angle = np.median(angles)
+                return -median_angle if abs(median_angle) > 0.5 else 0
+
+        return 0
+    except Exception as e:
+        logger.warning(f"Error in angle detection: {str(e)}")
+        return 0
+
+def rotate_image(img_array, angle):
+    """Rotate counter-clockwise about the center, filling uncovered corners with white"""
+    height, width = img_array.shape[:2]
+    matrix = cv2.getRotationMatrix2D(((width - 1) / 2, (height - 1) / 2), angle, 1.0)
+    fill = (255,) * img_array.shape[2] if len(img_array.shape) == 3 else 255
+    return cv2.warpAffine(img_array, matrix, (width, height), flags=cv2.INTER_LINEAR, borderValue=fill)
+
+def enhance_image_quality(img):
+    """Apply various image enhancement techniques"""
+    try:
+        # Convert to PIL Image if needed
+        if isinstance(img, np.ndarray):
+            img = Image.fromarray(img)
+
+        # Sharpen the image
+        img = img.filter(ImageFilter.SHARPEN)
+
+        # Enhance contrast
+        enhancer = ImageEnhance.Contrast(img)
+        img = enhancer.enhance(2.0)
+
+        # Enhance sharpness again
+        enhancer = ImageEnhance.Sharpness(img)
+        img = enhancer.enhance(1.5)
+
+        return img
+    except Exception as e:
+        logger.error(f"Error in image enhancement: {str(e)}")
+        return img
+
+def remove_noise(img_array):
+    """Remove noise from image"""
+    try:
+        # Apply bilateral filter to remove noise while preserving edges
+        denoised = cv2.bilateralFilter(img_array, 9, 75, 75)
+
+        # Apply median blur to remove salt-and-pepper noise
+        denoised = cv2.medianBlur(denoised, 3)
+
+        return denoised
+    except Exception as e:
+        logger.error(f"Error in noise removal: {str(e)}")
+        return img_array
+
+class PreprocessPipeline:
+    """Image preprocessing stages that can each be switched on, off or left to auto-skip"""
+
+    def __init__(self, modes=None):
+        self.modes = dict(DEFAULT_MODES)
+        for stage, mode in (modes or {}).items():
+            if stage not in STAGES or mode not in MODES:
+                raise ValueError(f"Invalid preprocessing stage setting: {stage}={mode}")
+            self.modes[stage] = mode
+
+        self._lock = threading.Lock()
+        self.runs = {stage: 0 for stage in STAGES}
+        self.skips = {stage: 0 for stage in STAGES}
+        self.seconds = {stage: 0.0 for stage in STAGES}
+
+    @classmethod
+    def from_spec(cls, spec):
+        """Build a pipeline from a string such as 'denoise=on,clahe=off'"""
+        modes = {}
+        for item in (spec or '').split(','):
+            if item.strip():
+                stage, _, mode = item.partition('=')
+                modes[stage.strip()] = mode.strip()
+        return cls(modes)
+
+    def run(self, img, synthetic=False, angle=None):
+        """Preprocess an image; returns the binarized PIL image and per-stage seconds"""
+        context = {'synthetic': synthetic, 'angle': angle}
+        img_array = np.array(img) if isinstance(img, Image.Image) else img
+
+        timings = {}
+        for stage in STAGES:
+            if self._skipped(stage, context):
+                with self._lock:
+                    self.skips[stage] += 1
+                continue
+
+            start = time.perf_counter()
+            try:
+                img_array = getattr(self, f"_{stage}")(img_array, context)
+            except Exception as e:
+                logger.error(f"Error in preprocessing stage {stage}: {str(e)}")
+            timings[stage] = time.perf_counter() - start
+
+            with self._lock:
+                self.runs[stage] += 1
+                self.seconds[stage] += timings[stage]
+
+        return Image.fromarray(img_array), timings
+
+    def stats(self):
+        """Per-stage modes, run and skip counts and mean latency"""
+        with self._lock:
+            return {
+                stage: {
+                    'mode': self.modes[stage],
+                    'runs': self.runs[stage],
+                    'skips': self.skips[stage],
+                    'mean_ms': 1000.0 * self.seconds[stage] / self.runs[stage] if self.runs[stage] else 0.0
+                }
+                for stage in STAGES
+            }
+
+    def _skipped(self, stage, context):
+        mode = self.modes[stage]
+        if mode == 'off':
+            return True
+        return mode == 'auto' and context['synthetic'] and stage in SYNTHETIC_SKIPS
+
+    def _enhance(self, img_array, context):
+        return np.array(enhance_image_quality(img_array))
+
+    def _deskew(self, img_array, context):
+        # Prefer an angle supplied by the caller over detecting one from pixels
+        angle = context['angle']
+        if angle is None or self.modes['deskew'] == 'on':
+            angle = detect_text_angle(img_array)
+        return rotate_image(img_array, angle) if angle != 0 else img_array
+
+    def _denoise(self, img_array, context):
+        return remove_noise(img_array)
+
+    def _clahe(self, img_array, context):
+        # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+        return clahe.apply(to_gray(img_array))
+
+    def _threshold(self, img_array, context):
+        # Adaptive threshold to black ink on white
+        binary = cv2.adaptiveThreshold(
+            to_gray(img_array),
+            255,
+            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
+            cv2.THRESH_BINARY_INV,
+            11,
+            2
+        )
+        return cv2.bitwise_not(binary)
+
+    def _morphology(self, img_array, context):
+        # Clean up using morphological operations on the inverted (white ink) image
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2,2))
+        inverted = cv2.bitwise_not(img_array)
+        inverted = cv2.morphologyEx(inverted, cv2.MORPH_CLOSE, kernel)
+        inverted = cv2.morphologyEx(inverted, cv2.MORPH_OPEN, kernel)
+        return cv2.bitwise_not(inverted)
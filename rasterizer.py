@@ -0,0 +1,156 @@
+import logging
+import math
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Coordinate space of the client board (index.html draws on an 800x600 canvas)
+CANVAS_SIZE = (800, 600)
+
+# Fixed-point precision used for sub-pixel polyline coordinates
+SUBPIXEL_BITS = 4
+
+# The legacy PIL renderer drew at twice the board resolution before downsampling
+REFERENCE_SCALE = 2
+
+# Largest supersampling factor; renders scaled far down from huge boards would
+# otherwise ask for buffers many times the output size on each side
+MAX_SUPERSAMPLE = 4
+
+# Largest accepted board coordinate magnitude in board pixels (the client board is 800x600)
+MAX_BOARD_EXTENT = 16384
+
+# Largest side of a cropped render; very wide ink is scaled down to fit
+MAX_OUTPUT_SIDE = 1600
+
+# Cropped renders are padded up to a multiple of this so similar crops can share OCR batches
+SIZE_QUANTUM = 32
+
+class BoardExtentError(ValueError):
+    """Raised for stroke coordinates that are not finite or lie outside MAX_BOARD_EXTENT"""
+
+class GridSizeError(ValueError):
+    """Raised for a gridSize that is not a positive finite number"""
+
+class PackedStrokes:
+    """Strokes already flattened into one point array plus stroke offsets"""
+
+    def __init__(self, points, offsets):
+        self.points = points
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        return self.points[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+def pack_strokes(strokes):
+    """Flatten a list of strokes into one point array plus stroke offsets"""
+    if isinstance(strokes, PackedStrokes):
+        return strokes.points, strokes.offsets
+
+    lengths = np.fromiter((len(stroke) for stroke in strokes), dtype=np.int64, count=len(strokes))
+    offsets = np.zeros(len(strokes) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    if offsets[-1] == 0:
+        return np.empty((0, 2), dtype=np.float32), offsets
+
+    # Only x and y are used even if a client sends extra per-point values
+    points = np.concatenate([
+        np.asarray(stroke, dtype=np.float32).reshape(len(stroke), -1)[:, :2]
+        for stroke in strokes if len(stroke)
+    ])
+    return points, offsets
+
+def check_extent(points, limit=MAX_BOARD_EXTENT):
+    """Raise BoardExtentError unless every coordinate is finite and within limit of the origin"""
+    if len(points) and not (np.isfinite(points).all() and np.abs(points).max() <= limit):
+        raise BoardExtentError(f"Stroke coordinates must lie within {limit} board pixels of the origin")
+
+def check_grid_size(grid_size):
+    """Return the client's gridSize if it is a positive finite number, else raise GridSizeError
+
+    The grid size divides render scales, cluster gaps and line positions, so it is
+    checked once where a request is read rather than wherever it is used.
+    """
+    if (isinstance(grid_size, bool) or not isinstance(grid_size, (int, float))
+            or not math.isfinite(grid_size) or grid_size <= 0):
+        raise GridSizeError(f"gridSize must be a positive number, got {grid_size!r}")
+    return grid_size
+
+def split_strokes(offsets):
+    """Yield (start, end) slices of strokes with at least one segment"""
+    starts = offsets[:-1]
+    ends = offsets[1:]
+    keep = (ends - starts) > 1
+    return zip(starts[keep].tolist(), ends[keep].tolist())
+
+def render_strokes(points, offsets, size=(400, 300), canvas_size=CANVAS_SIZE,
+                   line_width=2.0, supersample=None):
+    """Render packed strokes as anti-aliased polylines on a white grayscale buffer"""
+    width, height = size
+    if supersample is None:
+        # Match the reference resolution so stroke weight stays comparable
+        supersample = -(-REFERENCE_SCALE * canvas_size[0] // width)
+    supersample = max(1, min(int(supersample), MAX_SUPERSAMPLE))
+    buffer = np.full((height * supersample, width * supersample), 255, dtype=np.uint8)
+
+    if len(points):
+        scale = np.array([
+            width * supersample / canvas_size[0],
+            height * supersample / canvas_size[1]
+        ], dtype=np.float32)
+
+        # Scale every point at once and convert to fixed-point for cv2
+        fixed = np.rint(points * (scale * (1 << SUBPIXEL_BITS))).astype(np.int32)
+        polylines = [fixed[start:end] for start, end in split_strokes(offsets)]
+
+        if polylines:
+            # line_width is in board pixels; round half up so thin pens stay visible
+            thickness = max(1, int(line_width * scale[0] + 0.5))
+            cv2.polylines(buffer, polylines, False, 0, thickness, cv2.LINE_AA, SUBPIXEL_BITS)
+
+    if supersample > 1:
+        buffer = cv2.resize(buffer, (width, height), interpolation=cv2.INTER_AREA)
+
+    return buffer
+
+def ink_box(points, margin=0.0):
+    """Bounding box of the points padded by margin, as (x0, y0, x1, y1), or None without ink"""
+    if not len(points):
+        return None
+    x0, y0 = points.min(axis=0) - margin
+    x1, y1 = points.max(axis=0) + margin
+    return float(x0), float(y0), float(x1), float(y1)
+
+def render_scale(box, scale=1.0, max_side=MAX_OUTPUT_SIDE):
+    """Output pixels per board pixel that render_box uses for box"""
+    return min(scale, max_side / max(box[2] - box[0], box[3] - box[1], 1.0))
+
+def render_box(points, offsets, box, scale=1.0, max_side=MAX_OUTPUT_SIDE, quantum=SIZE_QUANTUM, line_width=2.0):
+    """Render only the part of the board inside box, at scale output pixels per board pixel"""
+    x0, y0, x1, y1 = box
+    scale = render_scale(box, scale, max_side)
+    # Round the output up to the quantum; the extra area extends the box right and down
+    width = max(quantum, quantum * math.ceil((x1 - x0) * scale / quantum))
+    height = max(quantum, quantum * math.ceil((y1 - y0) * scale / quantum))
+    return render_strokes(
+        points - np.array([x0, y0], dtype=np.float32),
+        offsets,
+        size=(width, height),
+        canvas_size=(width / scale, height / scale),
+        line_width=line_width
+    )
+
+def rasterize(strokes, size=(400, 300), **kwargs):
+    """Render a list of strokes straight to a grayscale array of the given size"""
+    points, offsets = pack_strokes(strokes)
+    return render_strokes(points, offsets, size=size, **kwargs)
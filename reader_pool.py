@@ -0,0 +1,151 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+def reader_memory_mb(reader):
+    """Estimate the resident size of an EasyOCR reader from its model parameters"""
+    # Backends wrap the EasyOCR reader they load
+    reader = getattr(reader, 'reader', reader)
+    total = 0
+    for name in ('detector', 'recognizer'):
+        module = getattr(reader, name, None)
+        parameters = getattr(module, 'parameters', None)
+        if parameters is None:
+            continue
+        try:
+            total += sum(p.numel() * p.element_size() for p in parameters())
+        except Exception as e:
+            logger.warning(f"Error estimating reader memory: {str(e)}")
+    return total / (1024 * 1024)
+
+class ReaderPool:
+    """Per-language OCR readers with LRU eviction under a count and memory budget"""
+
+    def __init__(self, factory, max_readers=4, memory_budget_mb=None, estimate_mb=reader_memory_mb):
+        # factory(lang) builds a new reader; it is called without holding the pool lock
+        self.factory = factory
+        self.max_readers = max(1, int(max_readers))
+        self.memory_budget_mb = memory_budget_mb
+        self.estimate_mb = estimate_mb
+
+        self._lock = threading.Lock()
+        self._readers = OrderedDict()
+        self._loading = {}
+        self.loads = 0
+        self.evictions = 0
+        self.load_failures = 0
+
+    def get(self, lang):
+        """Return the reader for lang, loading it if needed without blocking other languages"""
+        while True:
+            with self._lock:
+                entry = self._readers.get(lang)
+                if entry is not None:
+                    self._readers.move_to_end(lang)
+                    entry['last_used'] = time.time()
+                    entry['hits'] += 1
+                    return entry['reader']
+
+                event = self._loading.get(lang)
+                if event is None:
+                    # This thread becomes the loader for lang
+                    event = self._loading[lang] = threading.Event()
+                    break
+
+            # Another thread is loading this language; wait for it and look again
+            event.wait()
+
+        try:
+            reader, entry = self._load(lang)
+        except Exception:
+            with self._lock:
+                self.load_failures += 1
+                del self._loading[lang]
+            event.set()
+            raise
+
+        with self._lock:
+            self._readers[lang] = entry
+            self.loads += 1
+            self._evict()
+            del self._loading[lang]
+        event.set()
+        return reader
+
+    def preload(self, languages, background=True):
+        """Warm the pool with a list of languages, optionally on a background thread"""
+        def load_all():
+            for lang in languages:
+                try:
+                    self.get(lang)
+                except Exception as e:
+                    logger.error(f"Error preloading reader for {lang}: {str(e)}")
+
+        if not background:
+            load_all()
+            return None
+        thread = threading.Thread(target=load_all, name='reader-preload', daemon=True)
+        thread.start()
+        return thread
+
+    def missing(self, languages):
+        """Languages from the list that are not resident yet"""
+        with self._lock:
+            return [lang for lang in languages if lang not in self._readers]
+
+    def stats(self):
+        """Snapshot of resident readers and pool counters"""
+        with self._lock:
+            return {
+                'resident': [
+                    {
+                        'language': lang,
+                        'load_seconds': round(entry['load_seconds'], 3),
+                        'memory_mb': round(entry['memory_mb'], 1),
+                        'hits': entry['hits'],
+                        'last_used': entry['last_used']
+                    }
+                    for lang, entry in self._readers.items()
+                ],
+                'loading': sorted(self._loading),
+                'memory_mb': round(self._memory_mb(), 1),
+                'max_readers': self.max_readers,
+                'memory_budget_mb': self.memory_budget_mb,
+                'loads': self.loads,
+                'load_failures': self.load_failures,
+                'evictions': self.evictions
+            }
+
+    def _load(self, lang):
+        """Build a reader and record how long it took"""
+        logger.info(f"Initializing reader for language: {lang}")
+        start = time.perf_counter()
+        reader = self.factory(lang)
+        load_seconds = time.perf_counter() - start
+        memory_mb = self.estimate_mb(reader) if self.estimate_mb else 0.0
+        logger.info(f"Reader for {lang} loaded in {load_seconds:.2f}s ({memory_mb:.1f} MB)")
+        return reader, {
+            'reader': reader,
+            'load_seconds': load_seconds,
+            'memory_mb': memory_mb,
+            'hits': 0,
+            'last_used': time.time()
+        }
+
+    def _memory_mb(self):
+        return sum(entry['memory_mb'] for entry in self._readers.values())
+
+    def _over_budget(self):
+        if len(self._readers) > self.max_readers:
+            return True
+        return self.memory_budget_mb is not None and self._memory_mb() > self.memory_budget_mb
+
+    def _evict(self):
+        """Drop least recently used readers until the pool fits its budget, keeping the newest"""
+        while len(self._readers) > 1 and self._over_budget():
+            lang, _ = self._readers.popitem(last=False)
+            self.evictions += 1
+            logger.info(f"Evicted reader for language: {lang}")
@@ -0,0 +1,187 @@
+import collections
+import threading
+import time
+
+import pygame
+
+# Posted to the pygame event queue with text, position, strokes and seconds attributes
+RECOGNIZED = pygame.event.custom_type()
+
+def strokes_box(strokes):
+    """Bounding box (x0, y0, x1, y1) of the points of some strokes"""
+    xs = [point[0] for stroke in strokes for point in stroke]
+    ys = [point[1] for stroke in strokes for point in stroke]
+    return min(xs), min(ys), max(xs), max(ys)
+
+def boxes_near(a, b, gap):
+    """Whether two boxes overlap or are at most gap apart on both axes"""
+    return a[0] - gap <= b[2] and b[0] - gap <= a[2] and a[1] - gap <= b[3] and b[1] - gap <= a[3]
+
+class RecognitionWorker:
+    """Recognize finished strokes on a background thread and post the results as pygame events
+
+    Strokes that arrive while a recognition is running are coalesced into the pending job
+    whose ink they come within max_gap pixels of, so a character drawn in several strokes
+    is recognized once, as a whole; a stroke elsewhere on the board starts its own job. At
+    most max_pending jobs wait; when the queue is full the oldest job is dropped.
+    """
+
+    def __init__(self, recognize, max_pending=4, max_strokes=16, max_gap=20):
+        # recognize(strokes) runs on the worker thread and returns text or None
+        self.recognize = recognize
+        self.max_pending = max(1, int(max_pending))
+        self.max_strokes = max(1, int(max_strokes))
+        self.max_gap = max_gap
+
+        self._pending = collections.deque()
+        self._condition = threading.Condition()
+        self._closed = False
+        self._current = None
+        self.submitted = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.completed = 0
+
+        self._thread = threading.Thread(target=self._run, name='recognition', daemon=True)
+        self._thread.start()
+
+    def submit(self, stroke):
+        """Queue a finished stroke without blocking the event loop"""
+        with self._condition:
+            self.submitted += 1
+            if self._joins_pending(stroke):
+                self._pending[-1].append(stroke)
+                self.coalesced += 1
+            else:
+                if len(self._pending) >= self.max_pending:
+                    self._pending.popleft()
+                    self.dropped += 1
+                self._pending.append([stroke])
+            self._condition.notify()
+
+    def pending_strokes(self):
+        """Strokes submitted but not yet recognized, for drawing them until their result arrives"""
+        with self._condition:
+            jobs = ([self._current] if self._current else []) + list(self._pending)
+            return [stroke for job in jobs for stroke in job]
+
+    def stats(self):
+        with self._condition:
+            return {
+                'busy': self._current is not None,
+                'pending': len(self._pending),
+                'submitted': self.submitted,
+                'coalesced': self.coalesced,
+                'dropped': self.dropped,
+                'completed': self.completed
+            }
+
+    def close(self, timeout=2.0):
+        """Stop the worker; a recognition already running is abandoned after timeout"""
+        with self._condition:
+            self._closed = True
+            self._pending.clear()
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def _joins_pending(self, stroke):
+        """Whether stroke belongs to the newest pending job; called with the condition held"""
+        if self._current is None or not self._pending:
+            # Nothing is being recognized, so the stroke would not have to wait anyway
+            return False
+        job = self._pending[-1]
+        return len(job) < self.max_strokes and boxes_near(strokes_box([stroke]), strokes_box(job), self.max_gap)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                strokes = self._current = self._pending.popleft()
+
+            start = time.perf_counter()
+            text = self.recognize(strokes)
+            seconds = time.perf_counter() - start
+
+            with self._condition:
+                self._current = None
+                self.completed += 1
+                if self._closed:
+                    return
+            points = [point for stroke in strokes for point in stroke]
+            position = (
+                sum(x for x, _ in points) / len(points),
+                sum(y for _, y in points) / len(points)
+            )
+            try:
+                pygame.event.post(pygame.event.Event(
+                    RECOGNIZED,
+                    text=text,
+                    position=position,
+                    strokes=strokes,
+                    seconds=seconds
+                ))
+            except pygame.error:
+                # The display was closed while this stroke was being recognized
+                return
+
+class FrameTimer:
+    """Measure frame times and process CPU use of an event loop and print them every report_seconds"""
+
+    def __init__(self, report_seconds=5.0, budget_ms=1000 / 60, details=None):
+        # details(), if given, returns text appended to every report line
+        self.report_seconds = report_seconds
+        self.budget_ms = budget_ms
+        self.details = details
+        # Frame times rounded to 0.1 ms, so uncapped loops do not keep every sample
+        self.histogram = collections.Counter()
+        self.elapsed_ms = 0.0
+        self.total_frames = 0
+        self.slow_frames = 0
+        self.last = None
+        self.reported = time.perf_counter()
+        # CPU seconds of all threads, so recognition work shows up next to the frame times
+        self.cpu_reported = time.process_time()
+
+    def tick(self):
+        """Call once per frame, after the display update"""
+        now = time.perf_counter()
+        if self.last is not None:
+            frame_ms = (now - self.last) * 1000
+            self.histogram[round(frame_ms, 1)] += 1
+            self.elapsed_ms += frame_ms
+            self.total_frames += 1
+            if frame_ms > self.budget_ms * 1.5:
+                self.slow_frames += 1
+        self.last = now
+        if now - self.reported >= self.report_seconds:
+            self.report()
+            # Printing the report is not part of the next frame
+            self.last = self.reported = time.perf_counter()
+
+    def report(self):
+        frames = sum(self.histogram.values())
+        if not frames:
+            return
+        fps = 1000 * frames / self.elapsed_ms if self.elapsed_ms else 0.0
+        cpu = time.process_time()
+        cpu_percent = 100 * (cpu - self.cpu_reported) / (self.elapsed_ms / 1000) if self.elapsed_ms else 0.0
+        print(
+            f"frames: {fps:6.1f} fps  p50 {self._percentile(0.5):6.1f}  p95 {self._percentile(0.95):6.1f}  "
+            f"max {max(self.histogram):7.1f} ms  slow {self.slow_frames}/{self.total_frames}  cpu {cpu_percent:5.1f}%"
+            + (f"  {self.details()}" if self.details else '')
+        )
+        self.histogram.clear()
+        self.elapsed_ms = 0.0
+        self.cpu_reported = cpu
+
+    def _percentile(self, fraction):
+        rank = fraction * sum(self.histogram.values())
+        seen = 0
+        for frame_ms in sorted(self.histogram):
+            seen += self.histogram[frame_ms]
+            if seen >= rank:
+                return frame_ms
+        return max(self.histogram)
@@ -0,0 +1,151 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from rasterizer import pack_strokes
+
+logger = logging.getLogger(__name__)
+
+def stroke_key(strokes, grid_size=40, language='en', quantum=1.0):
+    """Canonical hash of quantized stroke geometry plus recognition settings"""
+    points, offsets = pack_strokes(strokes)
+    quantized = np.rint(points / quantum).astype(np.int32)
+
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{language}|{grid_size}|{quantum}|".encode('utf-8'))
+    digest.update(offsets.astype(np.int64).tobytes())
+    digest.update(quantized.tobytes())
+    return digest.hexdigest()
+
+def config_fingerprint(settings):
+    """Stable short hash of the settings that shape a response, for use as a cache namespace"""
+    encoded = json.dumps(settings, sort_keys=True, default=str)
+    return hashlib.blake2b(encoded.encode('utf-8'), digest_size=12).hexdigest()
+
+class ResultCache:
+    """LRU + TTL cache of recognition responses with an optional SQLite tier
+
+    namespace names the configuration (rendering, segmentation and recognition settings)
+    that produced the results; entries written under another namespace are never served.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=8 * 1024 * 1024, ttl=3600, disk_path=None, namespace=''):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.namespace = namespace
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.disk_hits = 0
+
+        self._db = None
+        if disk_path:
+            self._db = sqlite3.connect(disk_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS results "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._db.execute("DELETE FROM results WHERE expires < ?", (time.time(),))
+            self._db.commit()
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss"""
+        key = self._key(key)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires, size = entry
+                if expires >= now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                # Expired in memory; drop it and fall through to the disk tier
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires FROM results WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and row[1] >= now:
+                    value = json.loads(row[0])
+                    self._store(key, value, row[1], len(row[0]))
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return value
+
+            self.misses += 1
+            return None
+
+    def put(self, key, value):
+        """Cache a JSON-serializable value under key"""
+        key = self._key(key)
+        encoded = json.dumps(value)
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._store(key, value, expires, len(encoded))
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)",
+                        (key, encoded, expires)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.warning(f"Error writing result cache to disk: {str(e)}")
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM results")
+                self._db.commit()
+
+    def stats(self):
+        """Snapshot of cache counters"""
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'disk_hits': self.disk_hits,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'disk': self._db is not None,
+                'namespace': self.namespace
+            }
+
+    def _key(self, key):
+        return f"{self.namespace}|{key}" if self.namespace else key
+
+    def _store(self, key, value, expires, size):
+        """Insert into the memory tier and evict least recently used entries over budget"""
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[2]
+        self._entries[key] = (value, expires, size)
+        self._bytes += size
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self._bytes -= evicted_size
+            self.evictions += 1
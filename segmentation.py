@@ -0,0 +1,45 @@
+import logging
+
+from incremental import cluster_strokes
+
+logger = logging.getLogger(__name__)
+
+def group_lines(words, grid_size=40):
+    """Assign words to text lines by vertical position and order each line left to right"""
+    lines = []
+    for word in sorted(words, key=lambda w: (w['box'][1] + w['box'][3]) / 2):
+        center = (word['box'][1] + word['box'][3]) / 2
+        line = lines[-1] if lines else None
+        # A word continues the line when its center falls inside the line's band,
+        # widened by a quarter cell so descenders and short words still join
+        if line is not None and line['top'] - grid_size / 4 <= center <= line['bottom'] + grid_size / 4:
+            line['words'].append(word)
+            line['top'] = min(line['top'], word['box'][1])
+            line['bottom'] = max(line['bottom'], word['box'][3])
+        else:
+            lines.append({'words': [word], 'top': word['box'][1], 'bottom': word['box'][3]})
+
+    ordered = []
+    for index, line in enumerate(lines):
+        for word in sorted(line['words'], key=lambda w: w['box'][0]):
+            word['line'] = index
+            ordered.append(word)
+    return ordered
+
+def segment_words(strokes, grid_size=40):
+    """Word regions with line numbers, in reading order, from stroke geometry alone"""
+    return group_lines(cluster_strokes(strokes, grid_size), grid_size)
+
+def word_image_boxes(words, crop, scale, image_shape, padding=0.0):
+    """EasyOCR [x_min, x_max, y_min, y_max] boxes of the words in an image rendered from crop at scale"""
+    height, width = image_shape[:2]
+    boxes = []
+    for word in words:
+        x0, y0, x1, y1 = word['box']
+        boxes.append([
+            max(0, int((x0 - padding - crop[0]) * scale)),
+            min(width, int((x1 + padding - crop[0]) * scale + 1)),
+            max(0, int((y0 - padding - crop[1]) * scale)),
+            min(height, int((y1 + padding - crop[1]) * scale + 1))
+        ])
+    return boxes
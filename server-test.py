@@ -1,242 +1,191 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import numpy as np
-import easyocr
-from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
 import logging
-import cv2
-from scipy.ndimage import rotate
 import math
-import threading
-import sympy
-from sympy.parsing.latex import parse_latex
+from rasterizer import CANVAS_SIZE, check_extent, check_grid_size, ink_box, pack_strokes, render_box
+from simplify import simplify_strokes
+from preprocessing import PreprocessPipeline
+from skew import deskew_points, estimate_skew
+from result_cache import ResultCache, config_fingerprint, stroke_key
+from reader_pool import ReaderPool
+from ocr_backends import EasyOCRBackend
+from metrics import Metrics, install as install_metrics
+from logging_config import configure_logging, summarize_results, summarize_strokes
+from math_eval import MathEvaluator
 from collections import defaultdict
-import re
+import os
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+# Set up logging; LOG_FORMAT=json writes JSON lines and LOG_SAMPLE_RATE thins DEBUG records
+configure_logging(
+    level=os.environ.get('LOG_LEVEL', 'INFO'),
+    fmt=os.environ.get('LOG_FORMAT', 'text'),
+    sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
 
-# Dictionary to store language-specific readers
-readers = {}
-reader_lock = threading.Lock()
+# Per-stage latency histograms on /metrics; METRICS_ENABLED=0 turns the timers into no-ops
+metrics = Metrics(enabled=os.environ.get('METRICS_ENABLED', '1') != '0')
+install_metrics(app, metrics)
 
-def get_reader(lang):
-    """Get or create an EasyOCR reader for specific language"""
-    with reader_lock:
-        if lang not in readers:
-            logger.info(f"Initializing reader for language: {lang}")
-            if lang == 'math':
-                # For math, include English and common math symbols
-                readers[lang] = easyocr.Reader(
-                    ['en'],
-                    recog_network='english_g2',
-                    gpu=True,
-                    model_storage_directory='./models',
-                    user_network_directory='./models',
-                    download_enabled=True,
-                    allowlist='0123456789+-×÷=()[]{}^√∫∑∏πeαβγδθλμ∞∈∀∃∄∅∩∪⊂⊃⊆⊇≠≈≤≥'
-                )
-            else:
-                # For other languages, include the specific language and English
-                readers[lang] = easyocr.Reader(
-                    ['en', lang] if lang != 'en' else ['en'],
-                    gpu=True,
-                    model_storage_directory='./models',
-                    user_network_directory='./models',
-                    download_enabled=True
-                )
-        return readers[lang]
+# Preprocessing stages, overridable with e.g. PREPROCESS_STAGES='denoise=on,clahe=off'
+preprocess_pipeline = PreprocessPipeline.from_spec(os.environ.get('PREPROCESS_STAGES'))
 
-def detect_text_angle(image_array):
-    """Detect text angle for rotation correction"""
-    try:
-        # Convert to grayscale if needed
-        if len(image_array.shape) == 3:
-            gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = image_array
+# Skew correction: 'strokes' (from stroke geometry, image fallback), 'image' (Hough) or 'off'
+SKEW_MODE = os.environ.get('SKEW_MODE', 'strokes')
 
-        # Detect edges
-        edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-        
-        # Use Hough Transform to detect lines
-        lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=100)
-        
-        if lines is not None:
-            angles = []
-            for rho, theta in lines[:, 0]:
-                angle = np.degrees(theta)
-                if angle < 45:
-                    angles.append(angle)
-                elif angle > 135:
-                    angles.append(angle - 180)
-            
-            if angles:
-                median_angle = np.median(angles)
-                return -median_angle if abs(median_angle) > 0.5 else 0
-                
-        return 0
-    except Exception as e:
-        logger.warning(f"Error in angle detection: {str(e)}")
-        return 0
+# Output pixels per grid cell when rendering; the client's gridSize sets the board scale.
+# The default keeps the scale of the old fixed 800x600 render at the default 40px grid
+TARGET_GLYPH_HEIGHT = float(os.environ.get('TARGET_GLYPH_HEIGHT', 40))
 
-def enhance_image_quality(img):
-    """Apply various image enhancement techniques"""
-    try:
-        # Convert to PIL Image if needed
-        if isinstance(img, np.ndarray):
-            img = Image.fromarray(img)
+# Max deviation in board pixels allowed when dropping nearly collinear stroke points
+SIMPLIFY_TOLERANCE = float(os.environ.get('STROKE_SIMPLIFY_TOLERANCE', 0.75))
 
-        # Apply multiple enhancement steps
-        # Sharpen the image
-        img = img.filter(ImageFilter.SHARPEN)
-        
-        # Enhance contrast
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(2.0)
-        
-        # Enhance sharpness again
-        enhancer = ImageEnhance.Sharpness(img)
-        img = enhancer.enhance(1.5)
-        
-        return img
-    except Exception as e:
-        logger.error(f"Error in image enhancement: {str(e)}")
-        return img
+# Recognition parameters for every readtext call
+READTEXT_OPTIONS = dict(
+    paragraph=True,
+    decoder='beamsearch',
+    beamWidth=10,
+    workers=1,
+    contrast_ths=0.3,
+    adjust_contrast=0.5,
+    text_threshold=0.7,
+    low_text=0.4,
+    link_threshold=0.4,
+    mag_ratio=2.0,
+    slope_ths=0.1,
+    ycenter_ths=0.5,
+    height_ths=0.5,
+    width_ths=0.5,
+    add_margin=0.1
+)
 
-def remove_noise(img_array):
-    """Remove noise from image"""
-    try:
-        # Apply bilateral filter to remove noise while preserving edges
-        denoised = cv2.bilateralFilter(img_array, 9, 75, 75)
-        
-        # Apply median blur to remove salt-and-pepper noise
-        denoised = cv2.medianBlur(denoised, 3)
-        
-        return denoised
-    except Exception as e:
-        logger.error(f"Error in noise removal: {str(e)}")
-        return img_array
-
-def preprocess_image(img):
-    """Enhanced preprocessing pipeline"""
-    try:
-        # Convert to numpy array if needed
-        if isinstance(img, Image.Image):
-            img_array = np.array(img)
-        else:
-            img_array = img
+def create_reader(lang):
+    """Create an EasyOCR backend for specific language"""
+    reader_options = dict(
+        gpu=True,
+        model_storage_directory='./models',
+        user_network_directory='./models',
+        download_enabled=True
+    )
+    if lang == 'math':
+        # For math, include English and common math symbols
+        return EasyOCRBackend(
+            ['en'],
+            dict(reader_options, recog_network='english_g2'),
+            dict(READTEXT_OPTIONS, allowlist='0123456789+-×÷=()[]{}^√∫∑∏πeαβγδθλμ∞∈∀∃∄∅∩∪⊂⊃⊆⊇≠≈≤≥')
+        ).load()
+    # For other languages, include the specific language and English
+    return EasyOCRBackend(
+        ['en', lang] if lang != 'en' else ['en'],
+        reader_options,
+        READTEXT_OPTIONS
+    ).load()
 
-        # Detect and correct text angle
-        angle = detect_text_angle(img_array)
-        if angle != 0:
-            img_array = rotate(img_array, angle, reshape=False)
+# Language-specific readers, least recently used evicted first
+memory_budget = os.environ.get('READER_MEMORY_BUDGET_MB')
+reader_pool = ReaderPool(
+    create_reader,
+    max_readers=int(os.environ.get('READER_POOL_SIZE', 4)),
+    memory_budget_mb=float(memory_budget) if memory_budget else None
+)
 
-        # Remove noise
-        img_array = remove_noise(img_array)
-        
-        # Convert to grayscale if not already
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
+# Languages warm-loaded at startup; /readyz waits for all of them
+PRELOAD_LANGUAGES = [lang for lang in os.environ.get('PRELOAD_LANGUAGES', 'en').split(',') if lang]
 
-        # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        gray = clahe.apply(gray)
+def get_reader(lang):
+    """Get or create an EasyOCR reader for specific language"""
+    return reader_pool.get(lang)
 
-        # Apply adaptive thresholding
-        binary = cv2.adaptiveThreshold(
-            gray,
-            255,
-            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY_INV,
-            11,
-            2
-        )
+# Identical boards are answered from the cache instead of re-running OCR
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('RESULT_CACHE_TTL', 3600)),
+    disk_path=os.environ.get('RESULT_CACHE_PATH'),
+    # Fingerprint of the rendering and recognition settings, which also keeps these
+    # entries apart from server.py's
+    namespace=config_fingerprint({
+        'version': os.environ.get('RESULT_CACHE_VERSION', '1'),
+        'server': 'easyocr-pool',
+        'simplify_tolerance': SIMPLIFY_TOLERANCE,
+        'skew_mode': SKEW_MODE,
+        'target_glyph_height': TARGET_GLYPH_HEIGHT,
+        'preprocess': preprocess_pipeline.modes,
+        'readtext': READTEXT_OPTIONS
+    })
+)
 
-        # Clean up using morphological operations
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2,2))
-        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
-        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+def preprocess_image(img, synthetic=False, angle=None):
+    """Enhanced preprocessing pipeline"""
+    img, timings = preprocess_pipeline.run(img, synthetic=synthetic, angle=angle)
+    logger.debug("Preprocessing stage times: %s", timings)
+    for stage, seconds in timings.items():
+        metrics.observe(f"preprocess:{stage}", seconds)
+    return img
 
-        # Invert back
-        binary = cv2.bitwise_not(binary)
-        
-        return Image.fromarray(binary)
-    except Exception as e:
-        logger.error(f"Error in preprocessing: {str(e)}")
-        return img
+def correct_skew(points, offsets, grid_size, center):
+    """Level the strokes before rendering; returns the points and the angle left for the image stage"""
+    if SKEW_MODE == 'off':
+        return points, 0
+    if SKEW_MODE == 'strokes':
+        angle = estimate_skew(points, offsets, grid_size)
+        if angle is not None:
+            if angle:
+                points = deskew_points(points, angle, center)
+            return points, 0
+    # No reliable geometric estimate; let the image pipeline detect the angle
+    return points, None
 
 def strokes_to_image(strokes, grid_size=40):
     """Enhanced stroke to image conversion"""
     try:
-        # Create a high-resolution white image
-        img = Image.new('RGB', (1600, 1200), 'white')  # Doubled resolution
-        draw = ImageDraw.Draw(img)
-        
-        # Scale up strokes for higher resolution
-        scaled_strokes = [[(p[0]*2, p[1]*2) for p in stroke] for stroke in strokes]
-        
-        # Draw each stroke with smoother lines
-        for stroke in scaled_strokes:
-            if len(stroke) > 1:
-                # Draw multiple passes for smoother lines
-                for offset in [-1, 0, 1]:
-                    for i in range(len(stroke)-1):
-                        x1, y1 = stroke[i]
-                        x2, y2 = stroke[i+1]
-                        draw.line([(x1, y1+offset), (x2, y2+offset)], 
-                                fill='black', 
-                                width=4)  # Thicker lines for better recognition
-        
-        # Resize with high-quality downsampling
-        img = img.resize((800, 600), Image.Resampling.LANCZOS)
-        
-        # Enhance image quality
-        img = enhance_image_quality(img)
+        # Pack all strokes into one array and render them in a single batched pass
+        with metrics.timer('pack'):
+            points, offsets = pack_strokes(strokes)
+        with metrics.timer('simplify'):
+            points, offsets = simplify_strokes(points, offsets, SIMPLIFY_TOLERANCE)
+        with metrics.timer('skew'):
+            points, angle = correct_skew(points, offsets, grid_size, (CANVAS_SIZE[0] / 2, CANVAS_SIZE[1] / 2))
+
+        # Render only the ink, padded by half a grid cell, scaled so a grid cell
+        # (about one handwritten line) becomes TARGET_GLYPH_HEIGHT pixels
+        crop = ink_box(points, grid_size / 2) or (0, 0, CANVAS_SIZE[0], CANVAS_SIZE[1])
+        with metrics.timer('render'):
+            img = render_box(points, offsets, crop, scale=TARGET_GLYPH_HEIGHT / grid_size)
         
-        # Apply preprocessing
-        img = preprocess_image(img)
+        # Apply preprocessing; the raster is synthetic so noise-oriented stages can be skipped
+        with metrics.timer('preprocess'):
+            img = preprocess_image(img, synthetic=True, angle=angle)
         
         return img
     except Exception as e:
         logger.error(f"Error in strokes_to_image: {str(e)}")
         raise
 
+# SymPy runs in worker processes with a per-expression time budget and a result cache
+math_evaluator = MathEvaluator(
+    num_workers=int(os.environ.get('MATH_WORKERS', 2)),
+    timeout=float(os.environ.get('MATH_TIMEOUT', 2.0)),
+    cache_size=int(os.environ.get('MATH_CACHE_SIZE', 1024)),
+    memory_mb=float(os.environ.get('MATH_MEMORY_MB', 512))
+)
+
 def parse_math_expression(text):
     """Parse and validate mathematical expressions"""
-    try:
-        # Replace common OCR mistakes
-        text = text.replace('×', '*').replace('÷', '/')
-        
-        # Handle special cases
-        text = text.replace('√', 'sqrt')
-        
-        # Try to parse as LaTeX if it looks like LaTeX
-        if '\\' in text or '{' in text:
-            expr = parse_latex(text)
-        else:
-            # Clean up the expression
-            text = re.sub(r'\s+', '', text)
-            expr = sympy.sympify(text)
-        
-        # Try to evaluate or simplify
-        result = expr.evalf()
-        return str(expr), str(result)
-    except Exception as e:
-        logger.warning(f"Math parsing error: {str(e)}")
-        return text, None
+    return math_evaluator.evaluate(text)
 
 @app.route('/recognize', methods=['POST'])
 def recognize_text():
     try:
-        data = request.json
-        logger.debug(f"Received data: {data}")
+        with metrics.timer('parse'):
+            data = request.json
+        if logger.isEnabledFor(logging.DEBUG):
+            # Summarize the payload; formatting raw strokes costs more than recognizing them
+            logger.debug("Received request", extra={'fields': summarize_strokes(
+                data.get('strokes', []), request.content_length)})
         
         strokes = data.get('strokes', [])
         grid_size = data.get('gridSize', 40)
@@ -244,36 +193,36 @@ def recognize_text():
         
         if not strokes:
             return jsonify({'error': 'No strokes provided'}), 400
+        try:
+            # Coordinates far off the board would make the render unbounded, and the
+            # grid size divides the render scale
+            check_extent(pack_strokes(strokes)[0])
+            grid_size = check_grid_size(grid_size)
+        except (TypeError, ValueError) as e:
+            return jsonify({'error': f'Invalid request: {str(e)}'}), 400
+        
+        # Serve repeated recognitions of the same board from the cache
+        with metrics.timer('cache_lookup'):
+            cache_key = stroke_key(strokes, grid_size, lang)
+            cached = result_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Result cache hit")
+            return jsonify(cached)
         
         # Convert strokes to image with enhanced processing
         img = strokes_to_image(strokes, grid_size)
         
         # Get appropriate reader for language
-        reader = get_reader(lang)
+        with metrics.timer('reader'):
+            reader = get_reader(lang)
         
         # Recognize text with optimized parameters
         logger.debug("Starting text recognition")
-        results = reader.readtext(
-            np.array(img),
-            paragraph=True,
-            decoder='beamsearch',
-            beamWidth=10,
-            batch_size=1,
-            workers=1,
-            contrast_ths=0.3,
-            adjust_contrast=0.5,
-            text_threshold=0.7,
-            low_text=0.4,
-            link_threshold=0.4,
-            mag_ratio=2.0,
-            slope_ths=0.1,
-            ycenter_ths=0.5,
-            height_ths=0.5,
-            width_ths=0.5,
-            add_margin=0.1
-        )
+        with metrics.timer('ocr'):
+            results = reader.recognize_batch([np.array(img)])[0]
         
-        logger.debug(f"Recognition results: {results}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Recognition results", extra={'fields': summarize_results(results)})
         
         # Process and clean recognized text
         if results:
@@ -285,7 +234,8 @@ def recognize_text():
             
             # Handle math expressions if in math mode
             if lang == 'math':
-                expr, result = parse_math_expression(text)
+                with metrics.timer('math'):
+                    expr, result = parse_math_expression(text)
                 response = {
                     'text': expr,
                     'result': result
@@ -293,15 +243,47 @@ def recognize_text():
             else:
                 response = {'text': text}
                 
-            logger.info(f"Processed result: {response}")
-            return jsonify(response)
+            logger.info("Processed result: %s", response)
         else:
-            return jsonify({'text': 'No text detected'})
+            response = {'text': 'No text detected'}
+        
+        result_cache.put(cache_key, response)
+        return jsonify(response)
     
     except Exception as e:
         logger.error(f"Error in recognize_text: {str(e)}")
         return jsonify({'error': f'Error processing request: {str(e)}'}), 500
 
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    missing = reader_pool.missing(PRELOAD_LANGUAGES)
+    status = {'ready': not missing, 'loading': missing}
+    return jsonify(status), 503 if missing else 200
+
+@app.route('/readers', methods=['GET'])
+def reader_stats():
+    return jsonify(reader_pool.stats())
+
+@app.route('/preprocess/stats', methods=['GET'])
+def preprocess_stats():
+    return jsonify(preprocess_pipeline.stats())
+
+@app.route('/math/stats', methods=['GET'])
+def math_stats():
+    return jsonify(math_evaluator.stats())
+
 if __name__ == '__main__':
     print("Starting Enhanced AI Whiteboard server...")
+    # Warm the configured languages while the server starts accepting requests
+    reader_pool.preload(PRELOAD_LANGUAGES)
+    if 'math' in PRELOAD_LANGUAGES:
+        math_evaluator.start()
     app.run(debug=True)
\ No newline at end of file
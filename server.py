@@ -1,191 +1,428 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import numpy as np
-import easyocr
-from PIL import Image, ImageDraw, ImageEnhance, ImageFilter
 import logging
-import cv2
-from scipy.ndimage import rotate
 import math
+import os
+import json
+from concurrent.futures import as_completed
+from rasterizer import (CANVAS_SIZE, BoardExtentError, GridSizeError, PackedStrokes, check_extent,
+                        check_grid_size, ink_box, pack_strokes, render_box, render_scale)
+from simplify import simplify_strokes
+from preprocessing import PreprocessPipeline
+from skew import deskew_points, estimate_skew
+from stroke_codec import STROKES_MIME_TYPE, StrokeFormatError, decode_strokes
+from ocr_scheduler import BatchScheduler
+from result_cache import ResultCache, config_fingerprint, stroke_key
+from incremental import IncrementalRecognizer, cluster_strokes
+from segmentation import segment_words, word_image_boxes
+from jobs import JobManager, JobQueueFull
+from model_loader import LazyModel
+from metrics import Metrics, install as install_metrics
+from live_ink import install as install_live_ink
+from logging_config import configure_logging, summarize_results, summarize_strokes
+from ocr_backends import build_backend, lowest_confidence
+from worker_pool import ProcessWorkerPool, WorkersBusy, WorkerTimeout, backend_worker
 
-# Set up logging
-logging.basicConfig(level=logging.DEBUG)
+# Set up logging; LOG_FORMAT=json writes JSON lines and LOG_SAMPLE_RATE thins DEBUG records
+configure_logging(
+    level=os.environ.get('LOG_LEVEL', 'INFO'),
+    fmt=os.environ.get('LOG_FORMAT', 'text'),
+    sample_rate=float(os.environ.get('LOG_SAMPLE_RATE', 1.0))
+)
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
 
-# Initialize EasyOCR with additional parameters
-print("Initializing EasyOCR...")
-reader = easyocr.Reader(
-    ['en'],
+# Per-stage latency histograms on /metrics; METRICS_ENABLED=0 turns the timers into no-ops
+metrics = Metrics(enabled=os.environ.get('METRICS_ENABLED', '1') != '0')
+install_metrics(app, metrics)
+
+# Preprocessing stages, overridable with e.g. PREPROCESS_STAGES='denoise=on,clahe=off'
+preprocess_pipeline = PreprocessPipeline.from_spec(os.environ.get('PREPROCESS_STAGES'))
+
+# Skew correction: 'strokes' (from stroke geometry, image fallback), 'image' (Hough) or 'off'
+SKEW_MODE = os.environ.get('SKEW_MODE', 'strokes')
+
+# Output pixels per grid cell when rendering; the client's gridSize sets the board scale.
+# The default keeps the scale of the old fixed 400x300 render at the default 40px grid
+TARGET_GLYPH_HEIGHT = float(os.environ.get('TARGET_GLYPH_HEIGHT', 20))
+
+# Word boxes for full-board recognition: 'geometry' (from strokes, no text detection) or
+# 'detector' (EasyOCR's detector over the whole image)
+SEGMENTATION = os.environ.get('SEGMENTATION', 'geometry')
+
+# Max deviation in board pixels allowed when dropping nearly collinear stroke points
+SIMPLIFY_TOLERANCE = float(os.environ.get('STROKE_SIMPLIFY_TOLERANCE', 0.75))
+
+READER_OPTIONS = dict(
     recog_network='english_g2',  # Use more accurate model
     gpu=True  # Enable GPU if available
 )
-print("EasyOCR initialized successfully")
 
-def detect_text_angle(image_array):
-    """Detect text angle for rotation correction"""
-    try:
-        # Convert to grayscale if needed
-        if len(image_array.shape) == 3:
-            gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = image_array
-
-        # Detect edges
-        edges = cv2.Canny(gray, 50, 150, apertureSize=3)
-        
-        # Use Hough Transform to detect lines
-        lines = cv2.HoughLines(edges, 1, np.pi/180, threshold=100)
-        
-        if lines is not None:
-            angles = []
-            for rho, theta in lines[:, 0]:
-                angle = np.degrees(theta)
-                if angle < 45:
-                    angles.append(angle)
-                elif angle > 135:
-                    angles.append(angle - 180)
-            
-            if angles:
-                median_angle = np.median(angles)
-                return -median_angle if abs(median_angle) > 0.5 else 0
-                
-        return 0
-    except Exception as e:
-        logger.warning(f"Error in angle detection: {str(e)}")
-        return 0
+# OCR_WORKERS > 0 runs recognition in that many worker processes, each with its own reader
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 0))
 
-def enhance_image_quality(img):
-    """Apply various image enhancement techniques"""
-    try:
-        # Convert to PIL Image if needed
-        if isinstance(img, np.ndarray):
-            img = Image.fromarray(img)
+# Whole boards are recognized from geometry word boxes unless worker processes, which only
+# run full readtext, do the recognition
+GEOMETRY_WORDS = SEGMENTATION == 'geometry' and not OCR_WORKERS
 
-        # Apply multiple enhancement steps
-        # Sharpen the image
-        img = img.filter(ImageFilter.SHARPEN)
-        
-        # Enhance contrast
-        enhancer = ImageEnhance.Contrast(img)
-        img = enhancer.enhance(2.0)
-        
-        # Enhance sharpness again
-        enhancer = ImageEnhance.Sharpness(img)
-        img = enhancer.enhance(1.5)
-        
-        return img
-    except Exception as e:
-        logger.error(f"Error in image enhancement: {str(e)}")
-        return img
+# How long a request waits for a model that is still loading before giving up
+MODEL_WAIT_SECONDS = float(os.environ.get('MODEL_WAIT_SECONDS', 30))
 
-def remove_noise(img_array):
-    """Remove noise from image"""
-    try:
-        # Apply bilateral filter to remove noise while preserving edges
-        denoised = cv2.bilateralFilter(img_array, 9, 75, 75)
-        
-        # Apply median blur to remove salt-and-pepper noise
-        denoised = cv2.medianBlur(denoised, 3)
-        
-        return denoised
-    except Exception as e:
-        logger.error(f"Error in noise removal: {str(e)}")
-        return img_array
+# Recognition parameters shared by every batched readtext call; the decoder and beam width
+# come from OCR_DECODING and OCR_BEAM_WIDTH below
+READTEXT_OPTIONS = dict(
+    paragraph=True,
+    workers=1,
+    contrast_ths=0.3,
+    adjust_contrast=0.5,
+    text_threshold=0.7,
+    low_text=0.4,
+    link_threshold=0.4,
+    mag_ratio=2.0,
+    slope_ths=0.1,
+    ycenter_ths=0.5,
+    height_ths=0.5,
+    width_ths=0.5,
+    add_margin=0.1,
+    allowlist='ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,!?-() '
+)
+
+# OCR engine by name ('easyocr', 'tesseract' or 'onnx'); OCR_FAST_BACKEND, if set, takes
+# single-character word boxes so beam-search EasyOCR is kept for words and whole images
+OCR_BACKEND = os.environ.get('OCR_BACKEND', 'easyocr')
+OCR_FAST_BACKEND = os.environ.get('OCR_FAST_BACKEND')
+
+# EasyOCR decoding: 'greedy', 'beamsearch', or 'adaptive' (greedy first, then beam search
+# only for regions whose greedy confidence is below OCR_CONFIDENCE_THRESHOLD)
+OCR_DECODING = os.environ.get('OCR_DECODING', 'adaptive')
+OCR_CONFIDENCE_THRESHOLD = float(os.environ.get('OCR_CONFIDENCE_THRESHOLD', 0.5))
+OCR_BEAM_WIDTH = int(os.environ.get('OCR_BEAM_WIDTH', 10))
+
+# OCR_PRECISION sets EasyOCR's quantize option: int8 (EasyOCR's default, dynamically
+# quantized models on CPU-only nodes) or float. OCR_THREADS caps intra-op CPU threads
+OCR_PRECISION = os.environ.get('OCR_PRECISION') or None
+OCR_THREADS = int(os.environ.get('OCR_THREADS', 0)) or None
+
+def backend_options(name):
+    """Constructor options for a backend from this server's configuration"""
+    if name == 'easyocr':
+        return {
+            'languages': ['en'],
+            'reader_options': READER_OPTIONS,
+            'readtext_options': dict(READTEXT_OPTIONS, beamWidth=OCR_BEAM_WIDTH),
+            'decoding': OCR_DECODING,
+            'confidence_threshold': OCR_CONFIDENCE_THRESHOLD,
+            'beam_width': OCR_BEAM_WIDTH,
+            'precision': OCR_PRECISION,
+            'threads': OCR_THREADS
+        }
+    if name == 'tesseract':
+        return {'config': os.environ.get('TESSERACT_CONFIG', '--psm 10')}
+    if name == 'onnx':
+        return {
+            'model_path': os.environ.get('ONNX_MODEL_PATH', './models/recognizer.onnx'),
+            'charset': os.environ.get('ONNX_CHARSET', './models/recognizer_charset.txt'),
+            'threads': OCR_THREADS
+        }
+    return {}
 
-def preprocess_image(img):
+BACKEND_ARGS = (
+    OCR_BACKEND,
+    backend_options(OCR_BACKEND),
+    OCR_FAST_BACKEND,
+    backend_options(OCR_FAST_BACKEND) if OCR_FAST_BACKEND else None
+)
+BACKEND_NAME = f"{OCR_BACKEND}+{OCR_FAST_BACKEND}" if OCR_FAST_BACKEND else OCR_BACKEND
+
+if OCR_WORKERS:
+    # Workers load their backends concurrently; the pool counts as the model once all are up
+    scheduler = ProcessWorkerPool(
+        backend_worker,
+        BACKEND_ARGS,
+        num_workers=OCR_WORKERS,
+        submit_timeout=float(os.environ.get('OCR_SUBMIT_TIMEOUT', 30)),
+        result_timeout=float(os.environ.get('OCR_RESULT_TIMEOUT', 60))
+    )
+    ocr_model = LazyModel(f'{BACKEND_NAME}-x{OCR_WORKERS}', scheduler.start)
+else:
+    # The backend loads in the background; /readyz reports when it can serve requests
+    ocr_model = LazyModel(BACKEND_NAME, lambda: build_backend(*BACKEND_ARGS))
+
+def recognize_batch(images):
+    """Recognize a scheduler batch of preprocessed images with the loaded backend"""
+    backend = ocr_model.get()
+    with metrics.timer('ocr_batch'):
+        return backend.recognize_batch(images)
+
+def recognize_box_jobs(jobs):
+    """Recognize the word boxes of a scheduler batch of (image, boxes) jobs in one call"""
+    backend = ocr_model.get()
+    with metrics.timer('ocr_words'):
+        return backend.recognize_box_batch(jobs)
+
+if not OCR_WORKERS:
+    # Requests arriving within the batching window share one model call; word-box jobs
+    # from geometry segmentation go through the same queue
+    scheduler = BatchScheduler(
+        recognize_batch,
+        max_batch_size=int(os.environ.get('OCR_MAX_BATCH_SIZE', 8)),
+        max_wait_ms=float(os.environ.get('OCR_MAX_WAIT_MS', 10)),
+        recognize_boxes=recognize_box_jobs
+    )
+
+# Identical boards are answered from the cache instead of re-running OCR. Results are
+# namespaced by a fingerprint of every setting that shapes a response, from rendering to
+# the engine's options, so the disk tier never serves output made under another
+# configuration; bump RESULT_CACHE_VERSION after updating model weights
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('RESULT_CACHE_TTL', 3600)),
+    disk_path=os.environ.get('RESULT_CACHE_PATH'),
+    namespace=config_fingerprint({
+        'version': os.environ.get('RESULT_CACHE_VERSION', '1'),
+        'simplify_tolerance': SIMPLIFY_TOLERANCE,
+        'skew_mode': SKEW_MODE,
+        'target_glyph_height': TARGET_GLYPH_HEIGHT,
+        'preprocess': preprocess_pipeline.modes,
+        'geometry_words': GEOMETRY_WORDS,
+        'backend': BACKEND_ARGS
+    })
+)
+
+def preprocess_image(img, synthetic=False, angle=None):
     """Enhanced preprocessing pipeline"""
-    try:
-        # Convert to numpy array if needed
-        if isinstance(img, Image.Image):
-            img_array = np.array(img)
-        else:
-            img_array = img
-
-        # Detect and correct text angle
-        angle = detect_text_angle(img_array)
-        if angle != 0:
-            img_array = rotate(img_array, angle, reshape=False)
-
-        # Remove noise
-        img_array = remove_noise(img_array)
-        
-        # Convert to grayscale if not already
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = img_array
-
-        # Apply CLAHE (Contrast Limited Adaptive Histogram Equalization)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        gray = clahe.apply(gray)
-
-        # Apply adaptive thresholding
-        binary = cv2.adaptiveThreshold(
-            gray,
-            255,
-            cv2.ADAPTIVE_THRESH_GAUSSIAN_C,
-            cv2.THRESH_BINARY_INV,
-            11,
-            2
-        )
+    img, timings = preprocess_pipeline.run(img, synthetic=synthetic, angle=angle)
+    logger.debug("Preprocessing stage times: %s", timings)
+    for stage, seconds in timings.items():
+        metrics.observe(f"preprocess:{stage}", seconds)
+    return img
 
-        # Clean up using morphological operations
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2,2))
-        binary = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, kernel)
-        binary = cv2.morphologyEx(binary, cv2.MORPH_OPEN, kernel)
+def correct_skew(points, offsets, grid_size, center):
+    """Level the strokes before rendering; returns the points and the angle left for the image stage"""
+    if SKEW_MODE == 'off':
+        return points, 0
+    if SKEW_MODE == 'strokes':
+        angle = estimate_skew(points, offsets, grid_size)
+        if angle is not None:
+            if angle:
+                points = deskew_points(points, angle, center)
+            return points, 0
+    # No reliable geometric estimate; let the image pipeline detect the angle
+    return points, None
 
-        # Invert back
-        binary = cv2.bitwise_not(binary)
-        
-        return Image.fromarray(binary)
-    except Exception as e:
-        logger.error(f"Error in preprocessing: {str(e)}")
-        return img
+def render_board(strokes, grid_size=40, box=None, image_deskew=True):
+    """Pack, level, crop and render strokes; returns the image, the leveled strokes, the crop box and scale"""
+    # Pack all strokes into one array and render them in a single batched pass
+    with metrics.timer('pack'):
+        points, offsets = pack_strokes(strokes)
+    with metrics.timer('simplify'):
+        points, offsets = simplify_strokes(points, offsets, SIMPLIFY_TOLERANCE)
+    if box is None:
+        center = (CANVAS_SIZE[0] / 2, CANVAS_SIZE[1] / 2)
+    else:
+        center = ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+    with metrics.timer('skew'):
+        points, angle = correct_skew(points, offsets, grid_size, center)
+    if angle is None and not image_deskew:
+        # Rotating the image would move the ink away from geometry-derived boxes
+        angle = 0
+
+    # Render only the ink, padded by half a grid cell, scaled so a grid cell
+    # (about one handwritten line) becomes TARGET_GLYPH_HEIGHT pixels
+    crop = ink_box(points, grid_size / 2) or (0, 0, CANVAS_SIZE[0], CANVAS_SIZE[1])
+    scale = render_scale(crop, TARGET_GLYPH_HEIGHT / grid_size)
+    with metrics.timer('render'):
+        img = render_box(points, offsets, crop, scale=scale)
+    
+    # Apply preprocessing; the raster is synthetic so noise-oriented stages can be skipped
+    with metrics.timer('preprocess'):
+        img = preprocess_image(img, synthetic=True, angle=angle)
+    
+    return img, PackedStrokes(points, offsets), crop, scale
 
-def strokes_to_image(strokes, grid_size=40):
+def strokes_to_image(strokes, grid_size=40, box=None):
     """Enhanced stroke to image conversion"""
     try:
-        # Create a high-resolution white image
-        img = Image.new('RGB', (1600, 1200), 'white')  # Doubled resolution
-        draw = ImageDraw.Draw(img)
-        
-        # Scale up strokes for higher resolution
-        scaled_strokes = [[(p[0]*2, p[1]*2) for p in stroke] for stroke in strokes]
-        
-        # Draw each stroke with smoother lines
-        for stroke in scaled_strokes:
-            if len(stroke) > 1:
-                # Draw multiple passes for smoother lines
-                for offset in [-1, 0, 1]:
-                    for i in range(len(stroke)-1):
-                        x1, y1 = stroke[i]
-                        x2, y2 = stroke[i+1]
-                        draw.line([(x1, y1+offset), (x2, y2+offset)], 
-                                fill='black', 
-                                width=4)  # Thicker lines for better recognition
-        
-        # Resize with high-quality downsampling
-        img = img.resize((400, 300), Image.Resampling.LANCZOS)
-        
-        # Enhance image quality
-        img = enhance_image_quality(img)
-        
-        # Apply preprocessing
-        img = preprocess_image(img)
-        
-        return img
+        return render_board(strokes, grid_size, box)[0]
     except Exception as e:
         logger.error(f"Error in strokes_to_image: {str(e)}")
         raise
 
+def segment_board(strokes, grid_size=40):
+    """Render a board and cut it into words from stroke geometry; returns the words, image and word boxes"""
+    img, leveled, crop, scale = render_board(strokes, grid_size, image_deskew=False)
+    with metrics.timer('segment'):
+        # Boxes are in board coordinates after skew correction
+        words = segment_words(leveled, grid_size)
+    image = np.array(img)
+    boxes = word_image_boxes(words, crop, scale, image.shape, padding=0.1 * grid_size)
+    return words, image, boxes
+
+def decoded_words(words, decoded):
+    """Word entries of a response from segmented words and their (text, confidence)"""
+    return [
+        {'box': word['box'], 'line': word['line'], 'text': text, 'confidence': round_confidence(confidence)}
+        for word, (text, confidence) in zip(words, decoded)
+    ]
+
+def recognize_words_from_geometry(strokes, grid_size=40):
+    """Recognize a board word by word using stroke-derived word boxes instead of text detection"""
+    words, image, boxes = segment_board(strokes, grid_size)
+    # Queued on the scheduler so word-box recognition is serialized with every other model call
+    decoded = scheduler.submit_boxes(image, boxes).result() if boxes else []
+    return decoded_words(words, decoded)
+
+def words_response(words):
+    """/recognize response for a board recognized word by word"""
+    text = results_to_text([(word['box'], word['text']) for word in words if word['text']])
+    confidence = lowest_confidence([(word['box'], word['text'], word['confidence']) for word in words])
+    return {'text': text or 'No text detected', 'confidence': confidence, 'words': words}
+
+def results_response(results):
+    """/recognize response for a board recognized as one image"""
+    if not results:
+        return {'text': 'No text detected'}
+    return {'text': results_to_text(results), 'confidence': round_confidence(lowest_confidence(results))}
+
+def round_confidence(confidence):
+    """JSON-friendly confidence; engines may report numpy floats or nothing"""
+    return None if confidence is None else round(float(confidence), 4)
+
+def results_to_text(results):
+    """Combine EasyOCR results into one cleaned string"""
+    text = ' '.join([result[1] for result in results])
+    # Remove extra spaces and normalize punctuation
+    text = ' '.join(text.split())
+    return text.replace(' ,', ',').replace(' .', '.')
+
+def recognize_regions(regions, grid_size=40, job=None):
+    """Render and recognize board regions, sharing scheduler batches"""
+    futures = {
+        scheduler.submit(np.array(strokes_to_image(region['strokes'], grid_size, region['box']))): index
+        for index, region in enumerate(regions)
+    }
+
+    texts = [''] * len(regions)
+    for completed, future in enumerate(as_completed(futures), 1):
+        index = futures[future]
+        texts[index] = results_to_text(future.result())
+        if job is not None:
+            # Let streaming clients show each word as soon as it is recognized
+            job.publish('region', {
+                'box': regions[index]['box'],
+                'text': texts[index],
+                'completed': completed,
+                'total': len(regions)
+            })
+    return texts
+
+# Per-session region results for incremental recognition
+incremental = IncrementalRecognizer(
+    recognize_regions,
+    max_sessions=int(os.environ.get('INCREMENTAL_MAX_SESSIONS', 256))
+)
+
+def recognize_live(session_id, board):
+    """Recognize a live-ink board, re-recognizing only the regions changed since its last result"""
+    ocr_model.get(MODEL_WAIT_SECONDS)
+    with metrics.timer('live_recognize'):
+        regions, recognized = incremental.recognize(session_id, board.strokes, board.grid_size, board.language)
+    text = ' '.join(region['text'] for region in regions if region['text'])
+    logger.info("Live recognized text: %s (%d of %d regions recognized)", text, recognized, len(regions))
+    return {
+        'text': text or 'No text detected',
+        'regions': regions,
+        'recognized': recognized,
+        'reused': len(regions) - recognized
+    }
+
+# Clients stream stroke deltas over a WebSocket and get results after each pause in writing
+install_live_ink(
+    app,
+    recognize_live,
+    forget=incremental.forget,
+    debounce_seconds=float(os.environ.get('LIVE_DEBOUNCE_MS', 500)) / 1000,
+    max_points=int(os.environ.get('LIVE_MAX_POINTS', 100000))
+)
+
+def checked_strokes(strokes):
+    """Pack request strokes once and reject coordinates the renderer cannot bound"""
+    if not strokes:
+        return []
+    try:
+        points, offsets = pack_strokes(strokes)
+    except (TypeError, ValueError) as e:
+        raise StrokeFormatError(f"Malformed strokes: {str(e)}")
+    if points.shape[1] != 2:
+        raise StrokeFormatError("Points must be [x, y] pairs")
+    check_extent(points)
+    return PackedStrokes(points, offsets)
+
+@metrics.timed('parse')
+def parse_request_data():
+    """Read the recognition request from either a JSON or a binary stroke body"""
+    if request.mimetype == STROKES_MIME_TYPE:
+        # Binary bodies carry only strokes; options travel in the query string
+        data = {
+            'strokes': decode_strokes(request.get_data()),
+            'gridSize': request.args.get('gridSize', 40, type=int),
+            'language': request.args.get('language', 'en'),
+            'sessionId': request.args.get('sessionId')
+        }
+    else:
+        data = request.json
+    data['strokes'] = checked_strokes(data.get('strokes'))
+    data['gridSize'] = check_grid_size(data.get('gridSize', 40))
+    return data
+
+# Background recognitions started through /jobs
+job_manager = JobManager(
+    max_workers=int(os.environ.get('JOB_WORKERS', 4)),
+    max_pending=int(os.environ.get('JOB_MAX_PENDING', 64))
+)
+
+@metrics.timed('job')
+def recognize_job(job, strokes, grid_size, language='en', session_id=None):
+    """Recognize a board region by region, publishing each region as it finishes"""
+    def recognize_changed(changed, size):
+        return recognize_regions(changed, size, job)
+
+    if session_id:
+        regions, recognized = incremental.recognize(
+            session_id,
+            strokes,
+            grid_size,
+            language,
+            recognize_regions=recognize_changed
+        )
+    else:
+        regions = cluster_strokes(strokes, grid_size)
+        texts = recognize_changed(regions, grid_size)
+        regions = [
+            {'box': region['box'], 'text': text}
+            for region, text in zip(regions, texts)
+        ]
+        recognized = len(regions)
+
+    text = ' '.join(region['text'] for region in regions if region['text'])
+    return {
+        'text': text or 'No text detected',
+        'regions': regions,
+        'recognized': recognized,
+        'reused': len(regions) - recognized
+    }
+
 @app.route('/recognize', methods=['POST'])
 def recognize_text():
     try:
-        data = request.json
-        logger.debug(f"Received data: {data}")
+        data = parse_request_data()
+        if logger.isEnabledFor(logging.DEBUG):
+            # Summarize the payload; formatting raw strokes costs more than recognizing them
+            logger.debug("Received request", extra={'fields': summarize_strokes(
+                data.get('strokes', []), request.content_length)})
         
         strokes = data.get('strokes', [])
         grid_size = data.get('gridSize', 40)
@@ -193,6 +430,43 @@ def recognize_text():
         if not strokes:
             return jsonify({'error': 'No strokes provided'}), 400
         
+        if not ocr_model.wait(MODEL_WAIT_SECONDS):
+            return jsonify({'error': 'OCR model is not ready'}), 503
+        
+        # Boards with a session only re-recognize regions whose strokes changed
+        session_id = data.get('sessionId')
+        if session_id:
+            regions, recognized = incremental.recognize(
+                session_id,
+                strokes,
+                grid_size,
+                data.get('language', 'en')
+            )
+            text = ' '.join(region['text'] for region in regions if region['text'])
+            logger.info("Recognized text: %s (%d of %d regions recognized)", text, recognized, len(regions))
+            return jsonify({
+                'text': text or 'No text detected',
+                'regions': regions,
+                'recognized': recognized,
+                'reused': len(regions) - recognized
+            })
+        
+        # Serve repeated recognitions of the same board from the cache
+        with metrics.timer('cache_lookup'):
+            cache_key = stroke_key(strokes, grid_size, data.get('language', 'en'))
+            cached = result_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Result cache hit")
+            return jsonify(cached)
+        
+        # Recognize known word boxes directly; worker processes only run full readtext
+        if GEOMETRY_WORDS:
+            words = recognize_words_from_geometry(strokes, grid_size)
+            response = words_response(words)
+            logger.info("Recognized text: %s (%d words)", response['text'], len(words))
+            result_cache.put(cache_key, response)
+            return jsonify(response)
+        
         # Convert strokes to image with enhanced processing
         img = strokes_to_image(strokes, grid_size)
         
@@ -201,45 +475,123 @@ def recognize_text():
         
         # Recognize text with optimized parameters
         logger.debug("Starting text recognition")
-        results = reader.readtext(
-            np.array(img),
-            paragraph=True,
-            decoder='beamsearch',
-            beamWidth=10,
-            batch_size=1,
-            workers=1,
-            contrast_ths=0.3,
-            adjust_contrast=0.5,
-            text_threshold=0.7,
-            low_text=0.4,
-            link_threshold=0.4,
-            mag_ratio=2.0,
-            slope_ths=0.1,
-            ycenter_ths=0.5,
-            height_ths=0.5,
-            width_ths=0.5,
-            add_margin=0.1,
-            allowlist='ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789.,!?-() '
-        )
+        with metrics.timer('ocr'):
+            results = scheduler.recognize(np.array(img))
         
-        logger.debug(f"Recognition results: {results}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Recognition results", extra={'fields': summarize_results(results)})
         
         # Process and clean recognized text
-        if results:
-            # Combine results and clean text
-            text = ' '.join([result[1] for result in results])
-            # Remove extra spaces and normalize punctuation
-            text = ' '.join(text.split())
-            text = text.replace(' ,', ',').replace(' .', '.')
-            logger.info(f"Recognized text: {text}")
-            return jsonify({'text': text})
-        else:
-            return jsonify({'text': 'No text detected'})
+        response = results_response(results)
+        logger.info("Recognized text: %s", response['text'])
+        
+        result_cache.put(cache_key, response)
+        return jsonify(response)
     
+    except (StrokeFormatError, BoardExtentError) as e:
+        return jsonify({'error': f'Invalid stroke data: {str(e)}'}), 400
+    except GridSizeError as e:
+        return jsonify({'error': str(e)}), 400
+    except WorkersBusy as e:
+        return jsonify({'error': str(e)}), 503
+    except WorkerTimeout as e:
+        return jsonify({'error': str(e)}), 504
     except Exception as e:
         logger.error(f"Error in recognize_text: {str(e)}")
         return jsonify({'error': f'Error processing request: {str(e)}'}), 500
 
+@app.route('/jobs', methods=['POST'])
+def create_job():
+    try:
+        data = parse_request_data()
+        strokes = data.get('strokes', [])
+        if not strokes:
+            return jsonify({'error': 'No strokes provided'}), 400
+        if not ocr_model.wait(MODEL_WAIT_SECONDS):
+            return jsonify({'error': 'OCR model is not ready'}), 503
+
+        job = job_manager.submit(
+            recognize_job,
+            strokes,
+            data.get('gridSize', 40),
+            data.get('language', 'en'),
+            data.get('sessionId')
+        )
+        return jsonify({'jobId': job.id, 'status': job.status}), 202
+    except (StrokeFormatError, BoardExtentError) as e:
+        return jsonify({'error': f'Invalid stroke data: {str(e)}'}), 400
+    except GridSizeError as e:
+        return jsonify({'error': str(e)}), 400
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 503
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    return jsonify(job.snapshot())
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+
+    def stream():
+        # Server-Sent Events: replay what happened so far, then follow the job live
+        index = 0
+        while True:
+            events, done = job.wait_events(index, timeout=15)
+            for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            index += len(events)
+            if done and not events:
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+    return Response(stream(), mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    return jsonify({'status': 'ok'})
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    status = ocr_model.status()
+    return jsonify(status), 200 if status['state'] == 'ready' else 503
+
+@app.route('/jobs/stats', methods=['GET'])
+def jobs_stats():
+    return jsonify(job_manager.stats())
+
+@app.route('/scheduler/stats', methods=['GET'])
+def scheduler_stats():
+    return jsonify(scheduler.stats())
+
+@app.route('/incremental/stats', methods=['GET'])
+def incremental_stats():
+    return jsonify(incremental.stats())
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    return jsonify(result_cache.stats())
+
+@app.route('/preprocess/stats', methods=['GET'])
+def preprocess_stats():
+    return jsonify(preprocess_pipeline.stats())
+
+@app.route('/ocr/stats', methods=['GET'])
+def ocr_stats():
+    # Decoding counters live in the backend, which worker processes keep to themselves
+    if OCR_WORKERS:
+        return jsonify({'error': 'OCR stats are kept by the worker processes'}), 404
+    if not ocr_model.ready:
+        return jsonify({'error': 'OCR model is not ready'}), 503
+    return jsonify(ocr_model.get().stats())
+
 if __name__ == '__main__':
     print("Starting AI Whiteboard server...")
+    ocr_model.start()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,68 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def segment_distances(points, starts, ends, interior, segment_ids):
+    """Perpendicular distance of each interior point to its segment's chord"""
+    a = points[starts][segment_ids]
+    b = points[ends][segment_ids]
+    p = points[interior]
+
+    chord = b - a
+    offset = p - a
+    length = np.hypot(chord[:, 0], chord[:, 1])
+    cross = np.abs(chord[:, 0] * offset[:, 1] - chord[:, 1] * offset[:, 0])
+
+    # Closed loops have a zero-length chord; fall back to distance from the endpoint
+    with np.errstate(divide='ignore', invalid='ignore'):
+        distance = np.where(length > 0, cross / length, np.hypot(offset[:, 0], offset[:, 1]))
+    return distance
+
+def simplify_strokes(points, offsets, tolerance=0.75):
+    """Ramer-Douglas-Peucker simplification of all packed strokes at once"""
+    if tolerance <= 0 or len(points) == 0:
+        return points, offsets
+
+    lengths = np.diff(offsets)
+    nonempty = lengths > 0
+    keep = np.zeros(len(points), dtype=bool)
+    keep[offsets[:-1][nonempty]] = True
+    keep[offsets[1:][nonempty] - 1] = True
+
+    # Every stroke starts as one segment from its first to its last point
+    starts = offsets[:-1][lengths > 2]
+    ends = offsets[1:][lengths > 2] - 1
+
+    while len(starts):
+        counts = ends - starts - 1
+        first = np.cumsum(counts) - counts
+        segment_ids = np.repeat(np.arange(len(starts)), counts)
+        interior = np.repeat(starts + 1, counts) + np.arange(counts.sum()) - np.repeat(first, counts)
+
+        distance = segment_distances(points, starts, ends, interior, segment_ids)
+
+        # Farthest point per segment: first interior point that reaches the segment maximum
+        peak = np.maximum.reduceat(distance, first)
+        hits = np.flatnonzero(distance == peak[segment_ids])
+        hit_segments = segment_ids[hits]
+        farthest = hits[np.r_[True, hit_segments[1:] != hit_segments[:-1]]]
+        split = peak > tolerance
+
+        middle = interior[farthest[split]]
+        keep[middle] = True
+
+        # Split segments in two at their farthest point, dropping ones with no interior
+        starts = np.concatenate([starts[split], middle])
+        ends = np.concatenate([middle, ends[split]])
+        has_interior = ends - starts > 1
+        starts = starts[has_interior]
+        ends = ends[has_interior]
+
+    kept_per_stroke = np.add.reduceat(keep, offsets[:-1][nonempty]) if nonempty.any() else []
+    new_lengths = np.zeros(len(lengths), dtype=np.int64)
+    new_lengths[nonempty] = kept_per_stroke
+    new_offsets = np.zeros_like(offsets)
+    np.cumsum(new_lengths, out=new_offsets[1:])
+    return points[keep], new_offsets
@@ -0,0 +1,70 @@
+import logging
+
+import numpy as np
+
+from incremental import merge_overlapping, stroke_boxes
+
+logger = logging.getLogger(__name__)
+
+# Corrections smaller than this are not worth resampling for (matches the Hough path)
+MIN_SKEW_DEGREES = 0.5
+# Larger angles are more likely vertical writing or a bad estimate than skew
+MAX_SKEW_DEGREES = 45.0
+# Word regions whose major axis variance is not this many times the minor one are ignored
+MIN_ELONGATION = 3.0
+
+def weighted_median(values, weights):
+    """Median of values where each value counts with its weight"""
+    order = np.argsort(values)
+    cumulative = np.cumsum(weights[order])
+    return values[order][np.searchsorted(cumulative, cumulative[-1] / 2)]
+
+def estimate_skew(points, offsets, grid_size=40):
+    """Estimate the text baseline angle in degrees from stroke coordinates, or None if unsure"""
+    boxes, indices = stroke_boxes(points, offsets)
+    if len(boxes) == 0:
+        return None
+
+    # Word regions, grouped the way cluster_strokes groups them
+    labels = merge_overlapping(boxes, gap_x=0.5 * grid_size, gap_y=0.4 * grid_size)
+
+    # Word region of every point, so per-region moments come from bincount
+    stroke_labels = np.full(len(offsets) - 1, -1, dtype=np.int64)
+    stroke_labels[indices] = labels
+    point_labels = np.repeat(stroke_labels, np.diff(offsets))
+    x = points[:, 0].astype(np.float64)
+    y = points[:, 1].astype(np.float64)
+
+    count = np.bincount(point_labels)
+    nonempty = count > 2
+    count = count[nonempty]
+    mean_x = np.bincount(point_labels, x)[nonempty] / count
+    mean_y = np.bincount(point_labels, y)[nonempty] / count
+    cov_xx = np.bincount(point_labels, x * x)[nonempty] / count - mean_x ** 2
+    cov_yy = np.bincount(point_labels, y * y)[nonempty] / count - mean_y ** 2
+    cov_xy = np.bincount(point_labels, x * y)[nonempty] / count - mean_x * mean_y
+
+    # Each elongated region's principal axis approximates its baseline; positive
+    # angles mean text running downhill to the right in image coordinates
+    angles = 0.5 * np.arctan2(2 * cov_xy, cov_xx - cov_yy)
+    spread = np.sqrt(((cov_xx - cov_yy) / 2) ** 2 + cov_xy ** 2)
+    major = (cov_xx + cov_yy) / 2 + spread
+    minor = np.maximum((cov_xx + cov_yy) / 2 - spread, 1e-6)
+
+    elongated = (major / minor >= MIN_ELONGATION) & (np.abs(angles) < np.radians(MAX_SKEW_DEGREES))
+    if not elongated.any():
+        return None
+
+    # Longer words get more say in the board-wide estimate
+    angle = float(np.degrees(weighted_median(angles[elongated], np.sqrt(major[elongated]))))
+    return angle if abs(angle) >= MIN_SKEW_DEGREES else 0.0
+
+def deskew_points(points, angle, center):
+    """Rotate points about center so a baseline at the given angle becomes horizontal"""
+    theta = np.radians(-angle)
+    rotation = np.array([
+        [np.cos(theta), np.sin(theta)],
+        [-np.sin(theta), np.cos(theta)]
+    ], dtype=np.float32)
+    center = np.asarray(center, dtype=np.float32)
+    return (points - center) @ rotation + center
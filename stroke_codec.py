@@ -0,0 +1,76 @@
+import logging
+import struct
+import zlib
+
+import numpy as np
+
+from rasterizer import PackedStrokes, pack_strokes
+
+logger = logging.getLogger(__name__)
+
+# Content type of the binary /recognize body
+STROKES_MIME_TYPE = 'application/x-whiteboard-strokes'
+
+MAGIC = b'WBS1'
+VERSION = 1
+FLAG_ZLIB = 0x01
+
+# Upper bound on a decompressed body, so small uploads cannot inflate without limit
+MAX_DECODED_BYTES = 16 * 1024 * 1024
+
+# magic, version, flags, reserved, stroke count
+HEADER = struct.Struct('<4sBBHI')
+
+class StrokeFormatError(ValueError):
+    """Raised when a binary stroke body cannot be decoded"""
+
+def encode_strokes(strokes, compress=True):
+    """Encode strokes as delta-coded int16 coordinates with uint32 stroke lengths"""
+    points, offsets = pack_strokes(strokes)
+    coords = np.rint(points).astype(np.int32)
+
+    # Deltas run across stroke boundaries so one cumulative sum restores every point
+    deltas = np.diff(coords, axis=0, prepend=np.zeros((1, 2), dtype=np.int32))
+    if len(deltas) and np.abs(deltas).max() > 32767:
+        raise StrokeFormatError("Coordinate step too large for int16 deltas")
+
+    body = np.diff(offsets).astype('<u4').tobytes() + deltas.astype('<i2').tobytes()
+    flags = 0
+    if compress:
+        body = zlib.compress(body)
+        flags |= FLAG_ZLIB
+    return HEADER.pack(MAGIC, VERSION, flags, 0, len(offsets) - 1) + body
+
+def decode_strokes(data):
+    """Decode a binary stroke body into PackedStrokes without copying the raw arrays"""
+    if len(data) < HEADER.size:
+        raise StrokeFormatError("Stroke body shorter than header")
+
+    magic, version, flags, _, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise StrokeFormatError("Unrecognized stroke body")
+
+    body = memoryview(data)[HEADER.size:]
+    if flags & FLAG_ZLIB:
+        decompressor = zlib.decompressobj()
+        try:
+            body = decompressor.decompress(body, MAX_DECODED_BYTES)
+        except zlib.error as e:
+            raise StrokeFormatError(f"Invalid compressed stroke body: {str(e)}")
+        if decompressor.unconsumed_tail:
+            raise StrokeFormatError("Decompressed stroke body too large")
+
+    lengths_size = 4 * count
+    if len(body) < lengths_size:
+        raise StrokeFormatError("Stroke body truncated")
+    lengths = np.frombuffer(body, dtype='<u4', count=count)
+
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    total = int(offsets[-1])
+    if len(body) != lengths_size + 4 * total:
+        raise StrokeFormatError("Stroke body length does not match stroke lengths")
+
+    deltas = np.frombuffer(body, dtype='<i2', offset=lengths_size).reshape(total, 2)
+    points = np.cumsum(deltas, axis=0, dtype=np.float32)
+    return PackedStrokes(points, offsets)
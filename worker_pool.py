@@ -0,0 +1,340 @@
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ocr_backends import build_backend
+
+logger = logging.getLogger(__name__)
+
+# Smallest shared-memory slot per worker; grown on demand for larger images
+MIN_SLOT_BYTES = 1024 * 1024
+
+# How often an idle listener wakes to check the deadline of a newly submitted task
+POLL_SECONDS = 1.0
+
+class WorkersBusy(RuntimeError):
+    """Raised when no OCR worker frees up within the submit timeout"""
+
+class WorkerCrashed(RuntimeError):
+    """Raised for a request whose worker process died while handling it"""
+
+class WorkerTimeout(RuntimeError):
+    """Raised for a request its worker did not answer within the result timeout"""
+
+def backend_worker(*backend_args):
+    """Worker-side factory: build an OCR backend and return a one-image recognize function"""
+    backend = build_backend(*backend_args)
+
+    def recognize(image):
+        return backend.recognize_batch([image])[0]
+    return recognize
+
+def _worker_main(conn, factory, factory_args):
+    """Entry point of a worker process: load the model, then serve images from shared memory"""
+    try:
+        recognize = factory(*factory_args)
+    except Exception as e:
+        conn.send(('failed', None, str(e)))
+        return
+    conn.send(('ready', None, None))
+
+    attached = {}
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+
+        task_id, name, shape, dtype = message
+        try:
+            if name not in attached:
+                # The parent replaced its slot; drop the stale mapping
+                for old in attached.values():
+                    old.close()
+                attached = {name: shared_memory.SharedMemory(name=name)}
+            image = np.ndarray(shape, dtype=dtype, buffer=attached[name].buf)
+            conn.send(('result', task_id, recognize(image)))
+        except Exception as e:
+            conn.send(('error', task_id, str(e)))
+
+    for shm in attached.values():
+        shm.close()
+
+class _Worker:
+    """Parent-side handle of one worker process and its shared-memory slot"""
+
+    def __init__(self, index):
+        self.index = index
+        self.process = None
+        self.conn = None
+        self.slot = None
+        # (task id, future, deadline) of the request in flight
+        self.task = None
+        # Guarded by the pool lock: in the idle queue, owned by a request, process up.
+        # Only a worker that is none of queued, busy and down is put in the queue
+        self.queued = False
+        self.busy = False
+        self.available = False
+
+class ProcessWorkerPool:
+    """Recognize images in worker processes that each own a model, handing images over shared memory"""
+
+    def __init__(self, factory, factory_args=(), num_workers=2, submit_timeout=30.0, result_timeout=60.0):
+        # factory(*factory_args) runs inside each worker and returns recognize(image);
+        # a worker that takes longer than result_timeout on one image is restarted
+        self.factory = factory
+        self.factory_args = factory_args
+        self.num_workers = max(1, int(num_workers))
+        self.submit_timeout = submit_timeout
+        self.result_timeout = result_timeout
+
+        self._context = multiprocessing.get_context('spawn')
+        self._workers = [_Worker(i) for i in range(self.num_workers)]
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._task_ids = 0
+        self._closed = False
+        self.started = False
+        self.completed = 0
+        self.failed = 0
+        self.restarts = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def start(self):
+        """Spawn every worker at once and wait until each has loaded its model"""
+        errors = []
+
+        def spawn(worker):
+            try:
+                self._spawn(worker)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=spawn, args=(worker,), daemon=True) for worker in self._workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise errors[0]
+        for worker in self._workers:
+            with self._lock:
+                worker.available = True
+            self._queue_worker(worker)
+        self.started = True
+        return self
+
+    def submit(self, image):
+        """Queue an image on the next free worker, blocking while all are busy"""
+        deadline = time.monotonic() + self.submit_timeout
+        while True:
+            try:
+                worker = self._idle.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                with self._lock:
+                    self.rejected += 1
+                raise WorkersBusy("All OCR workers are busy")
+            with self._lock:
+                worker.queued = False
+                # A worker that died while queued is requeued once it has restarted
+                if worker.available:
+                    worker.busy = True
+                    break
+
+        image = np.ascontiguousarray(image)
+        if worker.slot is None or worker.slot.size < image.nbytes:
+            self._replace_slot(worker, image.nbytes)
+        np.ndarray(image.shape, dtype=image.dtype, buffer=worker.slot.buf)[...] = image
+
+        future = Future()
+        with self._lock:
+            self._task_ids += 1
+            task_id = self._task_ids
+            if not worker.available:
+                # Died while the image was copied; the restart requeues it
+                worker.busy = False
+                future.set_exception(WorkerCrashed(f"OCR worker {worker.index} crashed"))
+                self.failed += 1
+                return future
+            worker.task = (task_id, future, time.monotonic() + self.result_timeout)
+            conn = worker.conn
+        try:
+            conn.send((task_id, worker.slot.name, image.shape, image.dtype.str))
+        except (OSError, ValueError) as e:
+            # Unless the listener already failed the task, give the worker back. A broken
+            # pipe means the process is gone, so it waits for the restart to be requeued
+            with self._lock:
+                owned = worker.task is not None and worker.task[0] == task_id
+                if owned:
+                    worker.task = None
+                    worker.busy = False
+                    if worker.conn is conn:
+                        worker.available = False
+                    self.failed += 1
+            if owned:
+                future.set_exception(WorkerCrashed(str(e)))
+                self._queue_worker(worker)
+        return future
+
+    def recognize(self, image, timeout=None):
+        """Recognize one image and wait for its result; the pool fails it after result_timeout"""
+        return self.submit(image).result(timeout)
+
+    def stats(self):
+        """Snapshot of worker and request counters"""
+        with self._lock:
+            return {
+                'workers': self.num_workers,
+                'alive': sum(1 for w in self._workers if w.process is not None and w.process.is_alive()),
+                'idle': self._idle.qsize(),
+                'completed': self.completed,
+                'failed': self.failed,
+                'restarts': self.restarts,
+                'rejected': self.rejected,
+                'timeouts': self.timeouts
+            }
+
+    def close(self):
+        """Stop the workers and release their shared memory"""
+        self._closed = True
+        for worker in self._workers:
+            if worker.conn is not None:
+                try:
+                    worker.conn.send(None)
+                except (OSError, ValueError):
+                    pass
+        for worker in self._workers:
+            if worker.process is not None:
+                worker.process.join(5)
+                if worker.process.is_alive():
+                    worker.process.terminate()
+            self._release_slot(worker)
+
+    def _spawn(self, worker):
+        """Start a worker process, wait for its model and hand it to the listener thread
+
+        The caller marks the worker available and queues it.
+        """
+        parent_conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_conn, self.factory, self.factory_args),
+            name=f"ocr-worker-{worker.index}",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+
+        status, _, error = parent_conn.recv()
+        if status != 'ready':
+            process.join()
+            raise RuntimeError(f"OCR worker failed to start: {error}")
+
+        worker.process = process
+        worker.conn = parent_conn
+        threading.Thread(target=self._listen, args=(worker, parent_conn), daemon=True).start()
+
+    def _queue_worker(self, worker):
+        """Put a worker in the idle queue unless it is already there, busy or down"""
+        with self._lock:
+            if worker.queued or worker.busy or not worker.available:
+                return
+            worker.queued = True
+        self._idle.put(worker)
+
+    def _listen(self, worker, conn):
+        """Resolve results from one worker; restart it if the process dies or hangs"""
+        while True:
+            try:
+                if not conn.poll(self._poll_seconds(worker)):
+                    self._expire(worker)
+                    continue
+                status, task_id, payload = conn.recv()
+            except (EOFError, OSError):
+                break
+
+            with self._lock:
+                task = worker.task
+                if task is None or task[0] != task_id:
+                    # A late answer to a request that already timed out
+                    continue
+                worker.task = None
+                worker.busy = False
+                if status == 'result':
+                    self.completed += 1
+                else:
+                    self.failed += 1
+            if status == 'result':
+                task[1].set_result(payload)
+            else:
+                task[1].set_exception(RuntimeError(payload))
+            self._queue_worker(worker)
+
+        if self._closed:
+            return
+
+        worker.process.join(1)
+        logger.error(f"OCR worker {worker.index} exited with code {worker.process.exitcode}")
+        with self._lock:
+            # Out of service until restarted; submits skip it if it is still queued
+            worker.available = False
+            task, worker.task = worker.task, None
+            if task is not None:
+                worker.busy = False
+                self.failed += 1
+            self.restarts += 1
+        if task is not None:
+            task[1].set_exception(WorkerCrashed(f"OCR worker {worker.index} crashed"))
+        conn.close()
+        while not self._closed:
+            try:
+                self._spawn(worker)
+                with self._lock:
+                    worker.available = True
+                self._queue_worker(worker)
+                return
+            except Exception as e:
+                logger.error(f"Error restarting OCR worker {worker.index}: {str(e)}")
+                time.sleep(1)
+
+    def _poll_seconds(self, worker):
+        """How long the listener may wait for a message before checking the task deadline"""
+        with self._lock:
+            task = worker.task
+        if task is None:
+            return POLL_SECONDS
+        return max(0.0, min(POLL_SECONDS, task[2] - time.monotonic()))
+
+    def _expire(self, worker):
+        """Fail a request past its deadline and kill the worker, which the listener then restarts"""
+        with self._lock:
+            task = worker.task
+            if task is None or task[2] > time.monotonic():
+                return
+            worker.task = None
+            worker.busy = False
+            worker.available = False
+            self.failed += 1
+            self.timeouts += 1
+        logger.error(f"OCR worker {worker.index} took over {self.result_timeout}s on one image; restarting it")
+        task[1].set_exception(WorkerTimeout(f"OCR worker {worker.index} timed out"))
+        worker.process.kill()
+
+    def _replace_slot(self, worker, nbytes):
+        self._release_slot(worker)
+        worker.slot = shared_memory.SharedMemory(create=True, size=max(nbytes, MIN_SLOT_BYTES))
+
+    def _release_slot(self, worker):
+        if worker.slot is not None:
+            worker.slot.close()
+            worker.slot.unlink()
+            worker.slot = None